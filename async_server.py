@@ -0,0 +1,164 @@
+from quart import Quart, request, jsonify, send_file, redirect, Response
+from hypercorn.middleware import AsyncioWSGIMiddleware
+import os
+import re
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import server
+
+# Async serving mode: video info, progress and file downloads run on an event
+# loop and every other endpoint is served by the Flask app in server.py.
+# Run with: hypercorn async_server:app --bind 0.0.0.0:3002
+
+# Blocking calls are offloaded to executors sized for each kind of work
+EXTRACT_WORKERS = int(os.getenv('ASYNC_EXTRACT_WORKERS', 16))
+FILESYSTEM_WORKERS = int(os.getenv('ASYNC_FILESYSTEM_WORKERS', 4))
+EXTRACT_TIMEOUT = float(os.getenv('ASYNC_EXTRACT_TIMEOUT', 30))       # seconds
+FILESYSTEM_TIMEOUT = float(os.getenv('ASYNC_FILESYSTEM_TIMEOUT', 10))  # seconds
+EXTRACT_RETRY_AFTER = 5  # seconds suggested to clients while every extract worker is busy
+
+# Endpoints handled on the event loop
+ASYNC_ROUTES = [
+    ('POST', re.compile(r'^/api/video-info$')),
+    ('GET', re.compile(r'^/api/progress/[^/]+$')),
+    ('GET', re.compile(r'^/api/download/[^/]+/file(?:/[^/]+)?$'))
+]
+
+extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix='async-extract')
+filesystem_executor = ThreadPoolExecutor(max_workers=FILESYSTEM_WORKERS, thread_name_prefix='async-fs')
+# Timed out lookups keep running on their worker, so count them until they actually finish
+extract_slots = threading.BoundedSemaphore(EXTRACT_WORKERS)
+
+async_app = Quart(__name__)
+flask_app = AsyncioWSGIMiddleware(server.app)
+
+async def app(scope, receive, send):
+    """Route I/O-bound endpoints to the event loop and everything else to the Flask app"""
+    if scope['type'] == 'http' and not any(
+            scope['method'] == method and pattern.match(scope['path']) for method, pattern in ASYNC_ROUTES):
+        await flask_app(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
+
+async def run_blocking(executor, timeout, func, *args):
+    """Run a blocking call on an executor, waiting at most timeout seconds for it"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(executor, functools.partial(func, *args)), timeout)
+
+async def iter_blocking(executor, timeout, iterator):
+    """Pull items from a blocking iterator without blocking the event loop"""
+    done = object()
+    while True:
+        item = await run_blocking(executor, timeout, next, iterator, done)
+        if item is done:
+            break
+        yield item
+
+@async_app.after_request
+async def after_request(response):
+    origin = request.headers.get('Origin')
+    if origin in server.CORS_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-API-Key'
+    return response
+
+@async_app.route('/api/video-info', methods=['POST'])
+async def video_info():
+    """Get video information endpoint"""
+    try:
+        if not request.is_json:
+            return jsonify({
+                'status': 'error',
+                'message': 'Request must be JSON'
+            }), 400
+
+        data = await request.get_json()
+
+        # Refuse work that would only queue behind stuck lookups and time out unstarted
+        if not extract_slots.acquire(blocking=False):
+            response = jsonify({
+                'status': 'error',
+                'message': 'Too many video information requests. Please try again later.',
+                'retry_after': EXTRACT_RETRY_AFTER
+            })
+            response.headers['Retry-After'] = str(EXTRACT_RETRY_AFTER)
+            return response, 503
+        future = extract_executor.submit(
+            server.lookup_video_info, data, server.get_client_id(request), EXTRACT_TIMEOUT)
+        future.add_done_callback(lambda _: extract_slots.release())
+        body, status = await asyncio.wait_for(asyncio.wrap_future(future), EXTRACT_TIMEOUT)
+        return jsonify(body), status
+
+    except asyncio.TimeoutError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Video information lookup timed out'
+        }), 504
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@async_app.route('/api/progress/<download_id>', methods=['GET'])
+async def get_progress(download_id):
+    """Get download progress"""
+    try:
+        # Progress is kept in memory, so it is read on the event loop directly
+        body, status = server.download_progress(download_id)
+        return jsonify(body), status
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@async_app.route('/api/download/<download_id>/file', methods=['GET'])
+@async_app.route('/api/download/<download_id>/file/<format_type>', methods=['GET'])
+async def get_file(download_id, format_type=None):
+    """Get downloaded file, or one of the outputs of a multi-format download"""
+    try:
+        error, filename, name, filepath = await run_blocking(
+            filesystem_executor, FILESYSTEM_TIMEOUT, server.locate_file, download_id, format_type)
+        if error:
+            body, status = error
+            return jsonify(body), status
+
+        if not filepath:
+            store = server.artifact_store
+            if server.STORAGE_REDIRECT:
+                url = await run_blocking(filesystem_executor, FILESYSTEM_TIMEOUT, store.presigned_url, name, filename)
+                return redirect(url, 302)
+            chunks = iter_blocking(filesystem_executor, FILESYSTEM_TIMEOUT, store.iter_file(name))
+            response = Response(chunks, mimetype='application/octet-stream')
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+        return await send_file(
+            filepath,
+            as_attachment=True,
+            download_name=filename
+        )
+
+    except asyncio.TimeoutError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Storage did not respond in time'
+        }), 504
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    config = Config()
+    config.bind = ['0.0.0.0:3002']
+    asyncio.run(serve(app, config))
@@ -0,0 +1,275 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import argparse
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from downloaders.youtube_downloader import download_video as youtube_download
+    from downloaders.tiktok_downloader import download_video as tiktok_download
+    from downloaders.job_control import CancelToken, JobCancelled
+    from downloaders.errors import classify_error
+    from downloaders.url_router import detect_platform, url_key
+    from downloaders.tracing import JobTrace
+except ImportError:
+    from youtube_downloader import download_video as youtube_download
+    from tiktok_downloader import download_video as tiktok_download
+    from job_control import CancelToken, JobCancelled
+    from errors import classify_error
+    from url_router import detect_platform, url_key
+    from tracing import JobTrace
+
+DOWNLOAD_FUNCS = {
+    'youtube': youtube_download,
+    'tiktok': tiktok_download
+}
+FORMATS = ('mp4', 'mp3')
+PROGRESS_INTERVAL = 1.0  # seconds between progress events per job
+
+
+def default_output_dir():
+    """Same default for every entry point: TEMP_DIR or the project's downloads folder"""
+    return os.getenv('TEMP_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'downloads')
+
+
+def output_name(filename, key):
+    """
+    Name a finished file after its video, so items whose titles sanitize to the
+    same name (every non-ASCII title becomes 'video') never overwrite each other
+    """
+    if re.match(r'^\w+:[\w-]+$', key):
+        video_id = key.replace(':', '-')
+    else:
+        video_id = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    stem, ext = os.path.splitext(filename)
+    return f'{stem} [{video_id}]{ext}'
+
+
+def read_urls(source, default_format):
+    """Read (url, format) pairs from lines of 'url [format]', skipping blanks and comments"""
+    items = []
+    for line in source:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split()
+        format_type = parts[1].lower() if len(parts) > 1 else default_format
+        items.append((parts[0], format_type))
+    return items
+
+
+class Manifest:
+    """Append-only JSONL record of finished items, used to resume a batch"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('status') == 'completed':
+                        self.completed[(entry['key'], entry['format'])] = entry
+
+    def is_completed(self, key, format_type, output_dir):
+        entry = self.completed.get((key, format_type))
+        return bool(entry) and os.path.exists(os.path.join(output_dir, entry.get('filename') or ''))
+
+    def record(self, entry):
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class BatchRunner:
+    """Downloads many URLs in one process with bounded parallelism"""
+
+    def __init__(self, output_dir, workers, connections, manifest, default_platform=None, out=None):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.manifest = manifest
+        self.default_platform = default_platform
+        self.out = out or sys.stdout
+        self._out_lock = threading.Lock()
+        self._platform_slots = {name: threading.Semaphore(connections) for name in DOWNLOAD_FUNCS}
+        self._tokens = set()
+        self._tokens_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'completed': 0, 'failed': 0, 'skipped': 0, 'bytes': 0}
+
+    def count(self, outcome, transferred=0):
+        with self._stats_lock:
+            self.stats[outcome] += 1
+            self.stats['bytes'] += transferred
+
+    def emit(self, event, **data):
+        """Write one NDJSON event"""
+        with self._out_lock:
+            self.out.write(json.dumps({'event': event, 'time': round(time.time(), 3), **data}) + '\n')
+            self.out.flush()
+
+    def cancel_all(self):
+        with self._tokens_lock:
+            for token in self._tokens:
+                token.cancel('interrupted')
+
+    def run_item(self, url, format_type):
+        platform = detect_platform(url) or self.default_platform
+        key = url_key(url)
+        if platform not in DOWNLOAD_FUNCS or format_type not in FORMATS:
+            self.count('failed')
+            self.emit('error', url=url, error='Unsupported platform or format')
+            return
+
+        token = CancelToken()
+        trace = JobTrace()
+        last_emit = [0.0]
+
+        def on_progress(d):
+            now = time.time()
+            if d.get('status') == 'downloading' and now - last_emit[0] >= PROGRESS_INTERVAL:
+                last_emit[0] = now
+                self.emit('progress', url=url,
+                          downloaded_bytes=d.get('downloaded_bytes'),
+                          total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                          speed=d.get('speed'))
+
+        with self._tokens_lock:
+            self._tokens.add(token)
+        started = time.time()
+        entry = {'url': url, 'key': key, 'format': format_type, 'platform': platform}
+        # Each item downloads in its own workspace, like the server's jobs, so parallel
+        # items never share partial files
+        workspace = os.path.join(self.output_dir, '.work', uuid.uuid4().hex)
+        try:
+            with self._platform_slots[platform]:
+                self.emit('start', url=url, platform=platform, format=format_type)
+                filename = DOWNLOAD_FUNCS[platform](url, format_type, workspace, token, on_progress, trace)
+            final_name = output_name(filename, key)
+            os.replace(os.path.join(workspace, filename), os.path.join(self.output_dir, final_name))
+            filename = final_name
+            transferred = sum(span['bytes'] for span in trace.to_dict()['spans'] if span['phase'] == 'transfer')
+            entry.update(status='completed', filename=filename, bytes=transferred,
+                         elapsed=round(time.time() - started, 3))
+            self.count('completed', transferred)
+            self.emit('done', **entry)
+        except JobCancelled:
+            entry.update(status='cancelled')
+            self.emit('cancelled', url=url)
+            return
+        except Exception as e:
+            error = classify_error(e)
+            entry.update(status='failed', error=str(e), category=error.category,
+                         elapsed=round(time.time() - started, 3))
+            self.count('failed')
+            self.emit('error', **entry)
+        finally:
+            with self._tokens_lock:
+                self._tokens.discard(token)
+            shutil.rmtree(workspace, ignore_errors=True)
+        self.manifest.record(entry)
+
+    def run(self, items):
+        started = time.time()
+        pending = []
+        seen = set()
+        for url, format_type in items:
+            key = (url_key(url), format_type)
+            if key in seen or self.manifest.is_completed(key[0], format_type, self.output_dir):
+                self.count('skipped')
+                self.emit('skipped', url=url, format=format_type)
+                continue
+            seen.add(key)
+            pending.append((url, format_type))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = [executor.submit(self.run_item, url, format_type) for url, format_type in pending]
+            for future in futures:
+                while not future.done():
+                    # Short waits keep Ctrl+C responsive
+                    time.sleep(0.2)
+        except KeyboardInterrupt:
+            self.cancel_all()
+            self.emit('interrupted')
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.time() - started
+        self.emit('summary', **self.stats,
+                  elapsed=round(elapsed, 3),
+                  throughput_bytes_per_sec=round(self.stats['bytes'] / elapsed, 1) if elapsed else 0)
+        return 0 if self.stats['failed'] == 0 else 1
+
+
+def parse_args(argv, default_platform=None):
+    parser = argparse.ArgumentParser(description='Download one or many videos')
+    parser.add_argument('urls', nargs='*', help='video URLs')
+    parser.add_argument('-i', '--input', help="file with one 'url [format]' per line, or - for stdin")
+    parser.add_argument('-f', '--format', default='mp4', choices=FORMATS, help='default output format')
+    parser.add_argument('-o', '--output-dir', default=default_output_dir(), help='download directory')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='parallel downloads')
+    parser.add_argument('-c', '--connections', type=int, default=2,
+                        help='maximum parallel downloads per platform')
+    parser.add_argument('-m', '--manifest', help='JSONL manifest used to skip completed items when resuming')
+    parser.add_argument('-p', '--platform', default=default_platform, choices=tuple(DOWNLOAD_FUNCS),
+                        help='platform for URLs that cannot be detected')
+    return parser.parse_args(argv)
+
+
+def normalize_legacy_args(argv):
+    """Accept the old '<url> <format> [download_dir]' form of the downloader scripts"""
+    if len(argv) in (2, 3) and not argv[0].startswith('-') and argv[1].lower() in FORMATS:
+        legacy = [argv[0], '-f', argv[1].lower()]
+        if len(argv) == 3:
+            legacy += ['-o', argv[2]]
+        return legacy
+    return argv
+
+
+def main(argv=None, default_platform=None):
+    args = parse_args(normalize_legacy_args(sys.argv[1:] if argv is None else argv), default_platform)
+
+    items = [(url, args.format) for url in args.urls]
+    if args.input == '-':
+        items += read_urls(sys.stdin, args.format)
+    elif args.input:
+        with open(args.input, encoding='utf-8') as f:
+            items += read_urls(f, args.format)
+    if not items:
+        print('No URLs given', file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Keep stdout for NDJSON events; downloader chatter goes to stderr
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        runner = BatchRunner(args.output_dir, max(1, args.workers), max(1, args.connections),
+                             Manifest(args.manifest), args.platform, out)
+        return runner.run(items)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout = out
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import re
+import random
+from yt_dlp.utils import DownloadCancelled
+
+# Error categories
+RATE_LIMITED = 'rate_limited'
+FORBIDDEN = 'forbidden'
+NETWORK = 'network'
+UNAVAILABLE = 'unavailable'
+UNKNOWN = 'unknown'
+
+# Categories worth retrying later, which also indicate upstream health
+RETRYABLE_CATEGORIES = (RATE_LIMITED, FORBIDDEN, NETWORK)
+
+_PATTERNS = [
+    (RATE_LIMITED, re.compile(r'HTTP Error 429|Too Many Requests|rate.?limit|confirm you.re not a bot', re.I)),
+    (FORBIDDEN, re.compile(r'HTTP Error 403|Forbidden', re.I)),
+    (UNAVAILABLE, re.compile(
+        r'HTTP Error 404|Video unavailable|Private video|not available|has been removed|'
+        r'copyright|members-only|age-restricted|Unsupported URL|not exist', re.I)),
+    (NETWORK, re.compile(
+        r'timed? ?out|Connection (reset|refused|aborted)|Temporary failure|Name or service not known|'
+        r'getaddrinfo|Remote end closed|IncompleteRead|HTTP Error 5\d\d|urlopen error', re.I)),
+]
+
+
+class UpstreamError(Exception):
+    """A download failure classified by cause"""
+
+    def __init__(self, message, category=UNKNOWN, status=None):
+        super().__init__(message)
+        self.category = category
+        self.status = status
+
+    @property
+    def retryable(self):
+        return self.category in RETRYABLE_CATEGORIES
+
+
+def _find_http_status(exc):
+    """Find an HTTP status code anywhere in an exception chain"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        status = getattr(exc, 'status', None) or getattr(exc, 'code', None)
+        if isinstance(status, int) and 100 <= status < 600:
+            return status
+        exc_info = getattr(exc, 'exc_info', None)
+        inner = exc_info[1] if exc_info and len(exc_info) > 1 else None
+        exc = inner or exc.__cause__ or exc.__context__
+    return None
+
+
+def classify_error(exc):
+    """Classify an exception into an UpstreamError"""
+    if isinstance(exc, UpstreamError):
+        return exc
+
+    message = str(exc)
+    status = _find_http_status(exc)
+    if status == 429:
+        category = RATE_LIMITED
+    elif status == 403:
+        category = FORBIDDEN
+    elif status in (404, 410, 451):
+        category = UNAVAILABLE
+    elif status and status >= 500:
+        category = NETWORK
+    else:
+        category = next((name for name, pattern in _PATTERNS if pattern.search(message)), UNKNOWN)
+
+    return UpstreamError(message, category, status)
+
+
+def raise_classified(exc):
+    """Re-raise an exception as a classified UpstreamError, leaving cancellations alone"""
+    if isinstance(exc, (UpstreamError, DownloadCancelled)):
+        raise exc
+    raise classify_error(exc) from exc
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter for the given 0-based attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
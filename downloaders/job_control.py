@@ -0,0 +1,98 @@
+import os
+import threading
+import subprocess as sp
+from yt_dlp.utils import DownloadCancelled
+
+
+class JobCancelled(DownloadCancelled):
+    """Raised inside a download when its job has been cancelled"""
+    msg = 'Download cancelled'
+
+
+class CancelToken:
+    """
+    Cooperative cancellation handle shared between the server and a downloader.
+    The downloader calls check() from its yt-dlp hooks and runs ffmpeg through
+    run_process() so that cancel() can stop both the transfer and any child.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason='cancelled'):
+        """Request cancellation and kill any running child process"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            processes = list(self._processes)
+
+        for proc in processes:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+        return True
+
+    def check(self, *args):
+        """Raise JobCancelled if cancellation was requested (usable as a yt-dlp hook)"""
+        if self._event.is_set():
+            raise JobCancelled(f'Download {self.reason}')
+
+    def run_process(self, args):
+        """Run a child process that is killed if the job is cancelled"""
+        self.check()
+        proc = sp.Popen(args, stdout=sp.DEVNULL, stderr=sp.PIPE)
+        with self._lock:
+            self._processes.add(proc)
+            cancelled = self._event.is_set()
+        if cancelled:
+            proc.kill()
+
+        try:
+            _, stderr = proc.communicate()
+        finally:
+            with self._lock:
+                self._processes.discard(proc)
+
+        self.check()
+        return proc.returncode, stderr.decode('utf-8', 'replace')
+
+
+# ffmpeg output options for formats derived from a downloaded source
+TRANSCODE_ARGS = {
+    'mp3': ['-map', '0:a:0', '-vn', '-codec:a', 'libmp3lame', '-b:a', '192k']
+}
+
+
+def source_format(formats):
+    """Get the format to download so that every requested output can be derived from it"""
+    return 'mp4' if 'mp4' in formats else 'mp3'
+
+
+def transcode_outputs(ffmpeg_path, source_path, targets, cancel_token=None):
+    """
+    Derive several outputs from a downloaded file in a single cancellable
+    ffmpeg run, so the source is read and decoded only once
+    targets maps formats in TRANSCODE_ARGS to output paths
+    """
+    ffmpeg_exe = os.path.join(ffmpeg_path, 'ffmpeg.exe')
+    args = [ffmpeg_exe, '-y', '-loglevel', 'error', '-i', source_path]
+    for format_type, target_path in targets.items():
+        args += TRANSCODE_ARGS[format_type] + [target_path]
+
+    token = cancel_token or CancelToken()
+    returncode, stderr = token.run_process(args)
+    if returncode != 0:
+        for target_path in targets.values():
+            if os.path.exists(target_path):
+                os.unlink(target_path)
+        raise Exception(f"FFmpeg conversion failed: {stderr.strip()}")
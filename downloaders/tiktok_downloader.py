@@ -7,6 +7,17 @@ import traceback
 import re
 from pathlib import Path
 
+try:
+    from downloaders.job_control import CancelToken, TRANSCODE_ARGS, source_format, transcode_outputs
+    from downloaders.errors import backoff_delay, classify_error, raise_classified
+    from downloaders.url_router import route_for_extractor
+    from downloaders.tracing import JobTrace
+except ImportError:
+    from job_control import CancelToken, TRANSCODE_ARGS, source_format, transcode_outputs
+    from errors import backoff_delay, classify_error, raise_classified
+    from url_router import route_for_extractor
+    from tracing import JobTrace
+
 def debug_print(data):
     """Print debug information to stderr"""
     print("DEBUG:", json.dumps(data, indent=2), file=sys.stderr)
@@ -49,6 +60,9 @@ def get_tiktok_info(url):
     Returns a dictionary containing video details
     """
     try:
+        # Canonicalize known URLs so yt-dlp can skip extractor matching
+        url, ie_key = route_for_extractor(url)
+
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
@@ -57,7 +71,7 @@ def get_tiktok_info(url):
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             debug_print({"status": "extracting_info", "url": url})
-            info = ydl.extract_info(url, download=False)
+            info = ydl.extract_info(url, download=False, ie_key=ie_key)
             
             if not info:
                 raise ValueError("Failed to extract video information")
@@ -111,23 +125,46 @@ def get_tiktok_info(url):
         debug_print(error_info)
         raise
 
-def download_video(url, format_type, download_path):
-    """Download a video from TikTok"""
+def download_video(url, format_type, download_path, cancel_token=None, progress_callback=None, trace=None):
+    """
+    Download a video from TikTok
+    If a CancelToken is given, the download stops as soon as it is cancelled
+    progress_callback receives every yt-dlp progress update and may block to throttle
+    trace is a JobTrace that records the time and bytes of each phase
+    """
+    filenames = download_outputs(url, [format_type], download_path, cancel_token, progress_callback, trace)
+    return filenames[format_type.lower()]
+
+def download_outputs(url, formats, download_path, cancel_token=None, progress_callback=None, trace=None):
+    """
+    Download a TikTok video once and derive every requested format from it
+    Returns a dictionary of format to filename in download_path
+    """
+    cancel_token = cancel_token or CancelToken()
+    trace = trace or JobTrace()
+    formats = list(dict.fromkeys(f.lower() for f in formats))
     try:
+        # Canonicalize known URLs so yt-dlp can skip extractor matching
+        url, ie_key = route_for_extractor(url)
+
         # Ensure download directory exists
         os.makedirs(download_path, exist_ok=True)
         
         # Get FFmpeg path
+        trace.start('setup')
         ffmpeg_path = get_ffmpeg_path()
         debug_print({"message": f"Using FFmpeg from: {ffmpeg_path}"})
         
         if not os.path.exists(os.path.join(ffmpeg_path, 'ffmpeg.exe')):
             raise Exception(f"FFmpeg not found at {ffmpeg_path}")
+        trace.end('setup')
         
-        # Configure yt-dlp options
-        ydl_opts = {
-            'format': 'bestaudio/best' if format_type.lower() == 'mp3' else 'best',
-            'progress_hooks': [lambda d: send_progress({
+        def progress_hook(d):
+            cancel_token.check()
+            trace.record_progress(d)
+            if progress_callback:
+                progress_callback(d)
+            send_progress({
                 "status": "downloading",
                 "progress": d.get('percentage', 0),
                 "downloaded_bytes": d.get('downloaded_bytes', 0),
@@ -135,50 +172,57 @@ def download_video(url, format_type, download_path):
                 "speed": d.get('speed', 0),
                 "eta": d.get('eta', 0),
                 "filename": d.get('filename', '')
-            })],
+            })
+
+        # Configure yt-dlp options
+        ydl_opts = {
+            'format': 'bestaudio/best' if source_format(formats) == 'mp3' else 'best',
+            'progress_hooks': [progress_hook],
+            'postprocessor_hooks': [cancel_token.check],
             'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
             'ffmpeg_location': ffmpeg_path,
             'verbose': True,
             'retries': 3,
+            'retry_sleep_functions': {
+                'http': lambda n: backoff_delay(n),
+                'fragment': lambda n: backoff_delay(n),
+                'extractor': lambda n: backoff_delay(n)
+            },
             'socket_timeout': 30,
             'restrictfilenames': True,  # Restrict filenames to ASCII characters
         }
         
-        # Add format-specific options
-        if format_type.lower() == 'mp3':
-            ydl_opts.update({
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            })
-        
         # Download the video
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             try:
                 # Get video info first
                 debug_print({"status": "info", "message": "Extracting video info"})
-                info = ydl.extract_info(url, download=False)
+                trace.start('extract')
+                info = ydl.extract_info(url, download=False, ie_key=ie_key)
                 
                 if not info:
                     raise ValueError("Failed to extract video information")
+                trace.end('extract')
 
-                # Prepare filename
+                # Prepare filenames
                 title = info.get('title', 'tiktok_video')
-                ext = 'mp3' if format_type.lower() == 'mp3' else info.get('ext', 'mp4')
                 safe_title = sanitize_filename(title)
-                base_filename = f"{safe_title}.{ext}"
-                
+                filenames = {
+                    f: f"{safe_title}.{'mp3' if f == 'mp3' else info.get('ext', 'mp4')}"
+                    for f in formats
+                }
+
                 debug_print({
                     "status": "info",
                     "title": title,
-                    "filename": base_filename
+                    "filenames": filenames
                 })
                 
                 # Download the video
                 debug_print({"status": "downloading", "message": "Starting download"})
-                info = ydl.extract_info(url, download=True)
+                trace.start('transfer')
+                info = ydl.extract_info(url, download=True, ie_key=ie_key)
+                trace.end('transfer')
                 
                 # Get the actual downloaded file path
                 downloaded_path = None
@@ -189,26 +233,42 @@ def download_video(url, format_type, download_path):
                             downloaded_path = first_download['filepath']
                 
                 if not downloaded_path:
-                    downloaded_path = os.path.join(download_path, base_filename)
-                
+                    downloaded_path = os.path.join(download_path, filenames[source_format(formats)])
+
                 # Verify the download
+                trace.start('finalize')
                 if not os.path.exists(downloaded_path):
                     raise ValueError(f"Downloaded file not found at {downloaded_path}")
-                
-                # Rename file if necessary to ensure safe filename
-                final_path = os.path.join(download_path, base_filename)
-                if downloaded_path != final_path:
-                    os.rename(downloaded_path, final_path)
-                
+
+                # Convert every output that needs ffmpeg in one pass over the source
+                final_paths = {f: os.path.join(download_path, name) for f, name in filenames.items()}
+                derived = {f: path for f, path in final_paths.items()
+                           if f in TRANSCODE_ARGS and path != downloaded_path}
+                if derived:
+                    debug_print({"status": "converting", "message": "Extracting audio"})
+                    with trace.span('postprocess', tool='ffmpeg', outputs=len(derived)):
+                        transcode_outputs(ffmpeg_path, downloaded_path, derived, cancel_token)
+                        trace.add_bytes(sum(os.path.getsize(path) for path in derived.values()), 'postprocess')
+
+                # The downloaded file itself is the remaining output, renamed to a safe filename
+                kept = [path for f, path in final_paths.items() if f not in derived]
+                if not kept:
+                    os.unlink(downloaded_path)
+                elif downloaded_path != kept[0]:
+                    os.rename(downloaded_path, kept[0])
+                trace.add_bytes(sum(os.path.getsize(path) for path in final_paths.values()), 'finalize')
+                trace.end('finalize')
+
                 debug_print({
                     "status": "complete",
-                    "filename": base_filename,
+                    "filenames": filenames,
                     "message": "Download complete"
                 })
-                
-                print(f"filename: {base_filename}")
+
+                for base_filename in filenames.values():
+                    print(f"filename: {base_filename}")
                 sys.stdout.flush()
-                return base_filename
+                return filenames
                 
             except Exception as e:
                 error_msg = str(e)
@@ -218,21 +278,16 @@ def download_video(url, format_type, download_path):
                 
     except Exception as e:
         error_msg = str(e)
-        debug_print({"status": "error", "error": error_msg, "traceback": traceback.format_exc()})
-        send_progress({"status": "error", "error": error_msg})
-        raise
+        category = classify_error(e).category
+        debug_print({"status": "error", "error": error_msg, "category": category, "traceback": traceback.format_exc()})
+        send_progress({"status": "error", "error": error_msg, "category": category})
+        trace.fail(e)
+        raise_classified(e)
 
 if __name__ == '__main__':
-    if len(sys.argv) != 4:
-        print('Usage: python tiktok_downloader.py <url> <format> <download_path>')
-        sys.exit(1)
-        
-    url = sys.argv[1]
-    format_type = sys.argv[2]
-    download_path = sys.argv[3]
-    
+    # Single URLs ('<url> <format> [download_dir]') and batches share one CLI
     try:
-        download_video(url, format_type, download_path)
-    except Exception as e:
-        debug_print({"error": str(e), "traceback": traceback.format_exc()})
-        sys.exit(1)
+        from downloaders.cli import main
+    except ImportError:
+        from cli import main
+    sys.exit(main(default_platform='tiktok'))
@@ -0,0 +1,99 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class JobTrace:
+    """
+    Timeline of the phases a download goes through.
+    Each span records its start and end timestamps and the bytes handled in
+    it. Spans can be opened and closed from different threads, or used as a
+    context manager with span().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = time.time()
+        self.spans = []
+        self.profile = None
+        self._progress_bytes = {}
+
+    def start(self, phase, **attrs):
+        """Open a span and return it"""
+        span = {'phase': phase, 'start': time.time(), 'end': None, 'bytes': 0}
+        if attrs:
+            span['attrs'] = attrs
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def end(self, phase=None, **attrs):
+        """Close the most recent open span, optionally of a given phase"""
+        with self._lock:
+            for span in reversed(self.spans):
+                if span['end'] is None and (phase is None or span['phase'] == phase):
+                    span['end'] = time.time()
+                    if attrs:
+                        span.setdefault('attrs', {}).update(attrs)
+                    return span
+        return None
+
+    @contextmanager
+    def span(self, phase, **attrs):
+        span = self.start(phase, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.setdefault('attrs', {})['error'] = type(e).__name__
+            raise
+        finally:
+            with self._lock:
+                span['end'] = time.time()
+
+    def add_bytes(self, amount, phase=None):
+        """Count bytes towards the most recent open span, optionally of a given phase"""
+        with self._lock:
+            for span in reversed(self.spans):
+                if span['end'] is None and (phase is None or span['phase'] == phase):
+                    span['bytes'] += amount
+                    return
+
+    def record_progress(self, d, phase='transfer'):
+        """Count the bytes reported by a yt-dlp progress update"""
+        if d.get('status') not in ('downloading', 'finished'):
+            return
+        filename = d.get('filename')
+        downloaded = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+        with self._lock:
+            previous = self._progress_bytes.get(filename, 0)
+            self._progress_bytes[filename] = downloaded
+        if downloaded > previous:
+            self.add_bytes(downloaded - previous, phase)
+
+    def fail(self, error):
+        """Close every open span, marking it with the error that ended it"""
+        with self._lock:
+            for span in self.spans:
+                if span['end'] is None:
+                    span['end'] = time.time()
+                    span.setdefault('attrs', {})['error'] = type(error).__name__
+
+    def to_dict(self):
+        """Serialize the timeline with durations relative to job creation"""
+        now = time.time()
+        with self._lock:
+            spans = []
+            for span in self.spans:
+                end = span['end'] or now
+                spans.append({
+                    **span,
+                    'offset': round(span['start'] - self.created, 4),
+                    'duration': round(end - span['start'], 4),
+                    'open': span['end'] is None
+                })
+            return {
+                'created': self.created,
+                'elapsed': round(now - self.created, 4),
+                'spans': spans,
+                'profile': self.profile
+            }
@@ -0,0 +1,115 @@
+import re
+import time
+import threading
+import urllib.request
+from collections import OrderedDict, namedtuple
+
+# Recognized URL shapes, compiled once
+YOUTUBE_URL = re.compile(
+    r'^(?:https?://)?(?:(?:www|m|music)\.)?'
+    r'(?:youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|embed/|live/|v/)|youtube-nocookie\.com/embed/|youtu\.be/)'
+    r'([\w-]{11})(?![\w-])',
+    re.I)
+TIKTOK_URL = re.compile(
+    r'^(?:https?://)?(?:(?:www|m)\.)?tiktok\.com/(?:@([\w.-]+)/video/|embed/(?:v2/)?|v/)(\d+)',
+    re.I)
+TIKTOK_SHORT_URL = re.compile(
+    r'^(?:https?://)?(?:(?:vm|vt)\.tiktok\.com/|(?:www\.)?tiktok\.com/t/)([\w-]+)',
+    re.I)
+
+SHORT_LINK_CACHE_SIZE = 1024
+SHORT_LINK_TIMEOUT = 5  # seconds
+SHORT_LINK_FAILURE_TTL = 60  # seconds before a link that failed to resolve is tried again
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+_short_links = OrderedDict()  # url -> (resolved URL or None, expiry time or None)
+_short_links_lock = threading.Lock()
+
+
+class RoutedUrl(namedtuple('RoutedUrl', ['platform', 'video_id', 'url', 'extractor_key'])):
+    """A recognized video URL with its canonical form and yt-dlp extractor key"""
+
+    @property
+    def key(self):
+        """Stable identity for caching and deduplication"""
+        return f'{self.platform}:{self.video_id}'
+
+
+def resolve_short_link(url):
+    """
+    Follow a short link's redirects to the full URL, caching the result
+    Failures are cached for SHORT_LINK_FAILURE_TTL, so a dead link costs one timeout
+    """
+    with _short_links_lock:
+        if url in _short_links:
+            resolved, expires_at = _short_links[url]
+            if expires_at is None or time.monotonic() < expires_at:
+                _short_links.move_to_end(url)
+                return resolved
+            del _short_links[url]
+
+    target = url if '://' in url else f'https://{url}'
+    req = urllib.request.Request(target, method='HEAD', headers={'User-Agent': USER_AGENT})
+    expires_at = None
+    try:
+        with urllib.request.urlopen(req, timeout=SHORT_LINK_TIMEOUT) as response:
+            resolved = response.geturl()
+    except Exception:
+        resolved = None
+        expires_at = time.monotonic() + SHORT_LINK_FAILURE_TTL
+
+    with _short_links_lock:
+        _short_links[url] = (resolved, expires_at)
+        while len(_short_links) > SHORT_LINK_CACHE_SIZE:
+            _short_links.popitem(last=False)
+    return resolved
+
+
+def route_url(url, resolve_short_links=True):
+    """
+    Recognize a YouTube or TikTok URL
+    Returns a RoutedUrl, or None for URLs that need yt-dlp's generic matching
+    """
+    if not url:
+        return None
+    url = url.strip()
+
+    match = YOUTUBE_URL.match(url)
+    if match:
+        video_id = match.group(1)
+        return RoutedUrl('youtube', video_id, f'https://www.youtube.com/watch?v={video_id}', 'Youtube')
+
+    match = TIKTOK_URL.match(url)
+    if match:
+        user, video_id = match.groups()
+        # Same placeholder yt-dlp uses when the user is unknown
+        return RoutedUrl('tiktok', video_id, f'https://www.tiktok.com/@{user or "_"}/video/{video_id}', 'TikTok')
+
+    if resolve_short_links and TIKTOK_SHORT_URL.match(url):
+        resolved = resolve_short_link(url)
+        if resolved and not TIKTOK_SHORT_URL.match(resolved):
+            return route_url(resolved, resolve_short_links=False)
+
+    return None
+
+
+def detect_platform(url):
+    """Detect the platform of a URL without resolving short links"""
+    routed = route_url(url, resolve_short_links=False)
+    if routed:
+        return routed.platform
+    if url and TIKTOK_SHORT_URL.match(url.strip()):
+        return 'tiktok'
+    return None
+
+
+def route_for_extractor(url):
+    """Get the URL and extractor key to hand to yt-dlp's extract_info"""
+    routed = route_url(url)
+    return (routed.url, routed.extractor_key) if routed else (url, None)
+
+
+def url_key(url):
+    """Get the cache and deduplication key for a URL"""
+    routed = route_url(url)
+    return routed.key if routed else url.strip()
@@ -9,6 +9,17 @@ from datetime import datetime
 from pathlib import Path
 import subprocess as sp
 
+try:
+    from downloaders.job_control import CancelToken, TRANSCODE_ARGS, source_format, transcode_outputs
+    from downloaders.errors import backoff_delay, classify_error, raise_classified
+    from downloaders.url_router import route_for_extractor
+    from downloaders.tracing import JobTrace
+except ImportError:
+    from job_control import CancelToken, TRANSCODE_ARGS, source_format, transcode_outputs
+    from errors import backoff_delay, classify_error, raise_classified
+    from url_router import route_for_extractor
+    from tracing import JobTrace
+
 # Setup logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -151,6 +162,9 @@ def get_video_info(url):
     Returns a dictionary containing video details
     """
     try:
+        # Canonicalize known URLs so yt-dlp can skip extractor matching
+        url, ie_key = route_for_extractor(url)
+
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
@@ -159,7 +173,7 @@ def get_video_info(url):
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             debug_print(json.dumps({'status': 'extracting_info', 'url': url}))
-            info = ydl.extract_info(url, download=False)
+            info = ydl.extract_info(url, download=False, ie_key=ie_key)
             
             if not info:
                 raise ValueError("Failed to extract video information")
@@ -201,14 +215,33 @@ def get_video_info(url):
         debug_print(json.dumps(error_info))
         raise
 
-def download_video(url, format_type, temp_dir):
-    """Download video from URL"""
+def download_video(url, format_type, temp_dir, cancel_token=None, progress_callback=None, trace=None):
+    """
+    Download video from URL
+    If a CancelToken is given, the download stops as soon as it is cancelled
+    progress_callback receives every yt-dlp progress update and may block to throttle
+    trace is a JobTrace that records the time and bytes of each phase
+    """
+    filenames = download_outputs(url, [format_type], temp_dir, cancel_token, progress_callback, trace)
+    return filenames[format_type.lower()]
+
+def download_outputs(url, formats, temp_dir, cancel_token=None, progress_callback=None, trace=None):
+    """
+    Download a video once and derive every requested format from it
+    Returns a dictionary of format to filename in temp_dir
+    """
+    cancel_token = cancel_token or CancelToken()
+    trace = trace or JobTrace()
+    formats = list(dict.fromkeys(f.lower() for f in formats))
     try:
+        # Canonicalize known URLs so yt-dlp can skip extractor matching
+        url, ie_key = route_for_extractor(url)
+
         # Print initial debug info
         debug_print(json.dumps({
             'status': 'start',
             'url': url,
-            'format': format_type,
+            'formats': formats,
             'temp_dir': temp_dir
         }))
 
@@ -216,11 +249,17 @@ def download_video(url, format_type, temp_dir):
         os.makedirs(temp_dir, exist_ok=True)
 
         # Get FFmpeg path
+        trace.start('setup')
         ffmpeg_path = get_ffmpeg_path()
         if not ffmpeg_path or not os.path.exists(os.path.join(ffmpeg_path, 'ffmpeg.exe')):
             raise Exception(f"FFmpeg not found at {ffmpeg_path}")
+        trace.end('setup')
 
         def progress_hook(d):
+            cancel_token.check()
+            trace.record_progress(d)
+            if progress_callback:
+                progress_callback(d)
             if d['status'] == 'downloading':
                 progress_data = {
                     'status': 'downloading',
@@ -239,50 +278,52 @@ def download_video(url, format_type, temp_dir):
 
         # Configure yt-dlp options
         ydl_opts = {
-            'format': 'bestaudio/best' if format_type.lower() == 'mp3' else 'best',
+            'format': 'bestaudio/best' if source_format(formats) == 'mp3' else 'best',
             'progress_hooks': [progress_hook],
+            'postprocessor_hooks': [cancel_token.check],
             'ffmpeg_location': ffmpeg_path,
             'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
             'retries': 3,
+            'retry_sleep_functions': {
+                'http': lambda n: backoff_delay(n),
+                'fragment': lambda n: backoff_delay(n),
+                'extractor': lambda n: backoff_delay(n)
+            },
             'socket_timeout': 30,
             'restrictfilenames': True,  # Restrict filenames to ASCII characters
         }
 
-        # Add format-specific options
-        if format_type.lower() == 'mp3':
-            ydl_opts.update({
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            })
-
         # Initialize downloader
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             # Get video info first
             debug_print(json.dumps({"status": "info", "message": "Extracting video info"}))
-            info = ydl.extract_info(url, download=False)
+            trace.start('extract')
+            info = ydl.extract_info(url, download=False, ie_key=ie_key)
             
             if not info:
                 raise ValueError("Failed to extract video information")
+            trace.end('extract')
 
-            # Prepare filename
+            # Prepare filenames
             title = info.get('title', 'youtube_video')
-            ext = 'mp3' if format_type.lower() == 'mp3' else info.get('ext', 'mp4')
             safe_title = sanitize_filename(title)
-            base_filename = f"{safe_title}.{ext}"
+            filenames = {
+                f: f"{safe_title}.{'mp3' if f == 'mp3' else info.get('ext', 'mp4')}"
+                for f in formats
+            }
 
             # Send initial file info
             debug_print(json.dumps({
                 "status": "info",
                 "title": title,
-                "filename": base_filename
+                "filenames": filenames
             }))
 
             # Download the video
             debug_print(json.dumps({"status": "downloading", "message": "Starting download"}))
-            info = ydl.extract_info(url, download=True)
+            trace.start('transfer')
+            info = ydl.extract_info(url, download=True, ie_key=ie_key)
+            trace.end('transfer')
 
             # Get the actual downloaded file path
             downloaded_path = None
@@ -293,53 +334,59 @@ def download_video(url, format_type, temp_dir):
                         downloaded_path = first_download['filepath']
 
             if not downloaded_path:
-                downloaded_path = os.path.join(temp_dir, base_filename)
+                downloaded_path = os.path.join(temp_dir, filenames[source_format(formats)])
 
             # Verify the download
+            trace.start('finalize')
             if not os.path.exists(downloaded_path):
                 raise ValueError(f"Downloaded file not found at {downloaded_path}")
 
-            # Rename file if necessary to ensure safe filename
-            final_path = os.path.join(temp_dir, base_filename)
-            if downloaded_path != final_path and os.path.exists(downloaded_path):
-                os.rename(downloaded_path, final_path)
+            # Convert every output that needs ffmpeg in one pass over the source
+            final_paths = {f: os.path.join(temp_dir, name) for f, name in filenames.items()}
+            derived = {f: path for f, path in final_paths.items()
+                       if f in TRANSCODE_ARGS and path != downloaded_path}
+            if derived:
+                debug_print(json.dumps({"status": "converting", "message": "Extracting audio"}))
+                with trace.span('postprocess', tool='ffmpeg', outputs=len(derived)):
+                    transcode_outputs(ffmpeg_path, downloaded_path, derived, cancel_token)
+                    trace.add_bytes(sum(os.path.getsize(path) for path in derived.values()), 'postprocess')
+
+            # The downloaded file itself is the remaining output, renamed to a safe filename
+            kept = [path for f, path in final_paths.items() if f not in derived]
+            if not kept:
+                os.unlink(downloaded_path)
+            elif downloaded_path != kept[0]:
+                os.rename(downloaded_path, kept[0])
+            trace.add_bytes(sum(os.path.getsize(path) for path in final_paths.values()), 'finalize')
+            trace.end('finalize')
 
             # Send completion status
             debug_print(json.dumps({
                 "status": "complete",
-                "filename": base_filename,
+                "filenames": filenames,
                 "message": "Download complete"
             }))
 
-            print(f"filename: {base_filename}")
+            for base_filename in filenames.values():
+                print(f"filename: {base_filename}")
             sys.stdout.flush()
-            return base_filename
+            return filenames
 
     except Exception as e:
         error_info = {
             'status': 'error',
             'error': str(e),
+            'category': classify_error(e).category,
             'traceback': traceback.format_exc()
         }
         debug_print(json.dumps(error_info))
-        raise
+        trace.fail(e)
+        raise_classified(e)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        debug_print("Usage: python youtube_downloader.py <url> <format> [--temp-dir <dir>]")
-        sys.exit(1)
-        
-    url = sys.argv[1]
-    format_type = sys.argv[2]
-    temp_dir = os.getenv('TEMP_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'downloads')
-    
+    # Single URLs ('<url> <format> [download_dir]') and batches share one CLI
     try:
-        filename = download_video(url, format_type, temp_dir)
-        if filename is not None:
-            debug_print(f"Downloaded file: {filename}")
-        else:
-            debug_print("Download failed")
-    except Exception as e:
-        debug_print(f"Error: {str(e)}")
-        debug_print(f"Traceback: {traceback.format_exc()}")
-        sys.exit(1)
+        from downloaders.cli import main
+    except ImportError:
+        from cli import main
+    sys.exit(main(default_platform='youtube'))
@@ -1,23 +1,41 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, redirect
 from flask_cors import CORS
 import os
+import io
 import sys
 import json
 import time
 import threading
 import shutil
+import re
+import uuid
 from pathlib import Path
-from downloaders.youtube_downloader import download_video as youtube_download
-from downloaders.tiktok_downloader import download_video as tiktok_download
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from downloaders.youtube_downloader import download_outputs as youtube_download
+from downloaders.tiktok_downloader import download_outputs as tiktok_download
+from downloaders.job_control import CancelToken, JobCancelled, source_format
+from downloaders.errors import UpstreamError, backoff_delay
+from downloaders.url_router import route_url, route_for_extractor, detect_platform, url_key
+from downloaders.tracing import JobTrace
+from services.scheduler import DownloadScheduler, PRIORITIES, estimate_job_cost
+from services.bandwidth import BandwidthGovernor
+from services.circuit_breaker import CircuitBreaker
+from services.disk_quota import DiskQuota, estimate_disk_usage
+from services.batch import run_with_deadline, SUCCESS
+from services.profiling import JobProfiler
+from services.storage import create_storage
+from services.thumbnails import ThumbnailCache, ThumbnailError, THUMBNAIL_SIZES
 
 app = Flask(__name__)
+CORS_ORIGINS = ["http://localhost:3000", "http://localhost:3001"]
 
 # Configure CORS
 CORS(app, 
-     origins=["http://localhost:3000", "http://localhost:3001"],
+     origins=CORS_ORIGINS,
      supports_credentials=True,
-     allow_headers=["Content-Type"],
-     methods=["GET", "POST", "OPTIONS"])
+     allow_headers=["Content-Type", "X-API-Key"],
+     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 # Configure Flask middleware
 app.config['JSON_SORT_KEYS'] = False
@@ -26,95 +44,251 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size
 @app.after_request
 def after_request(response):
     origin = request.headers.get('Origin')
-    if origin in ["http://localhost:3000", "http://localhost:3001"]:
+    if origin in CORS_ORIGINS:
         response.headers['Access-Control-Allow-Origin'] = origin
         response.headers['Access-Control-Allow-Credentials'] = 'true'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-API-Key'
     return response
 
 # Constants
 MAX_CONCURRENT_DOWNLOADS = 5
-DOWNLOAD_TIMEOUT = 300  # 5 minutes
+DOWNLOAD_STALL_TIMEOUT = 600  # 10 minutes without progress, long enough for ffmpeg on long videos
 PROGRESS_TIMEOUT = 30   # 30 seconds
 CLEANUP_DELAY = 30      # 30 seconds after completion
+MAX_QUEUED_DOWNLOADS = 50
+VIDEO_INFO_CACHE_SIZE = 256
+VIDEO_INFO_CACHE_TTL = 600  # 10 minutes
+MAX_CONCURRENT_PROBES = 4
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+API_KEYS = {key.strip() for key in os.getenv('API_KEYS', '').split(',') if key.strip()}
+JOB_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 5    # seconds, doubled per attempt with jitter
+RETRY_MAX_DELAY = 120   # 2 minutes
+DOWNLOADS_QUOTA_BYTES = int(os.getenv('DOWNLOADS_QUOTA_BYTES', 10 * 1024 ** 3))  # 10GB
+MIN_FREE_DISK_BYTES = int(os.getenv('MIN_FREE_DISK_BYTES', 1024 ** 3))           # 1GB
+COMPLETED_FILE_TTL = int(os.getenv('COMPLETED_FILE_TTL', 24 * 60 * 60))          # 24 hours
+JANITOR_INTERVAL = 300  # 5 minutes
+SPECULATIVE_PREFETCH = os.getenv('SPECULATIVE_PREFETCH', '').lower() in ('1', 'true', 'yes')
+PREFETCH_DEFAULT_FORMAT = os.getenv('PREFETCH_DEFAULT_FORMAT', 'mp4')
+PREFETCH_MAX_JOBS = 2
+PREFETCH_MAX_BYTES = 100 * 1024 * 1024  # 100MB
+PREFETCH_TTL = 120  # 2 minutes
+CLIENT_FORMAT_CACHE_SIZE = 1024
+INFO_EXECUTOR_WORKERS = 8
+MAX_BATCH_URLS = 50
+BATCH_DEADLINE = 20     # seconds, default for a whole batch
+MAX_BATCH_DEADLINE = 60
+BATCH_ITEM_TIMEOUT = 10  # seconds, default per URL
+BATCH_MAX_IN_FLIGHT = INFO_EXECUTOR_WORKERS  # submitted extractions per batch
+BATCH_DEFAULT_FIELDS = ['title', 'duration', 'thumbnail', 'channel', 'platform']
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))  # fraction of jobs, 0-1
+SUPPORTED_FORMATS = ['mp3', 'mp4']
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')  # local or s3
+STORAGE_REDIRECT = os.getenv('STORAGE_REDIRECT', 'true').lower() in ('1', 'true', 'yes')
+S3_BUCKET = os.getenv('S3_BUCKET')
+S3_PREFIX = os.getenv('S3_PREFIX', '')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')  # for MinIO and other S3-compatible servers
+S3_REGION = os.getenv('S3_REGION')
+S3_PRESIGN_TTL = int(os.getenv('S3_PRESIGN_TTL', 3600))  # 1 hour
+THUMBNAIL_CACHE_BYTES = int(os.getenv('THUMBNAIL_CACHE_BYTES', 200 * 1024 * 1024))  # 200MB
+THUMBNAIL_DEFAULT_SIZE = 320
+THUMBNAIL_MAX_AGE = 7 * 24 * 60 * 60  # 7 days
+THUMBNAIL_EXTRACT_TIMEOUT = 10  # seconds
+THUMBNAIL_VIDEO_ID = re.compile(r'^[\w-]{1,64}$')
 
 # Global state
 active_downloads = {}
-download_id_to_url = {}
+download_id_to_key = {}
+video_info_cache = OrderedDict()
+video_info_cache_lock = threading.Lock()
+probe_semaphore = threading.Semaphore(MAX_CONCURRENT_PROBES)
+client_last_format = OrderedDict()
+client_last_format_lock = threading.Lock()
+info_executor = ThreadPoolExecutor(max_workers=INFO_EXECUTOR_WORKERS, thread_name_prefix='video-info')
+governor = BandwidthGovernor()
+breakers = {
+    'youtube': CircuitBreaker('youtube'),
+    'tiktok': CircuitBreaker('tiktok')
+}
 
 # Create downloads directory
 downloads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
 os.makedirs(downloads_dir, exist_ok=True)
 
+# Per-job workspaces keep partial data separate until a download completes
+workspaces_dir = os.path.join(downloads_dir, '.work')
+os.makedirs(workspaces_dir, exist_ok=True)
+
+# Sampled job profiles for offline analysis
+profiles_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+profiler = JobProfiler(profiles_dir, PROFILE_SAMPLE_RATE)
+
+# Resized thumbnails, served instead of the platforms' full-size images
+thumbnails_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbnails')
+thumbnail_cache = ThumbnailCache(thumbnails_dir, THUMBNAIL_CACHE_BYTES)
+
 def debug_print(message):
     """Print debug message to stdout and flush immediately"""
     print(message, flush=True)
     sys.stdout.flush()
 
-def cleanup_download(url, download_id):
+# Storage quota for completed files, with a background janitor
+disk_quota = DiskQuota(downloads_dir, DOWNLOADS_QUOTA_BYTES, MIN_FREE_DISK_BYTES, COMPLETED_FILE_TTL)
+disk_quota.start_janitor(JANITOR_INTERVAL, debug_print)
+
+# Where completed files are published; an S3 bucket can be shared by several nodes
+artifact_store = create_storage(
+    STORAGE_BACKEND, downloads_dir,
+    bucket=S3_BUCKET, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL,
+    region=S3_REGION, presign_ttl=S3_PRESIGN_TTL
+)
+
+if STORAGE_BACKEND == 's3':
+    # Objects in the shared bucket expire like local files, whichever node stored them
+    artifact_store.start_janitor(JANITOR_INTERVAL, COMPLETED_FILE_TTL, debug_print)
+
+def remove_artifact(name):
+    """Delete a completed file from the artifact store"""
+    if artifact_store.local_path(name):
+        disk_quota.remove_file(name)
+    else:
+        artifact_store.delete(name)
+
+def get_client_id(req=None):
+    """
+    Identify the client of a request (the current one by default) by API key, falling back to its IP address
+    Only keys in API_KEYS or in the bandwidth client_overrides count, so a client can't
+    escape its limits by sending a new key with every request
+    """
+    if req is None:
+        req = request
+    api_key = req.headers.get('X-API-Key')
+    if api_key:
+        client_id = f'key:{api_key}'
+        if api_key in API_KEYS or governor.has_overrides(client_id):
+            return client_id
+    return f'ip:{req.remote_addr}'
+
+def is_admin_request():
+    """Admin endpoints need ADMIN_TOKEN if set, otherwise a local request"""
+    if ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+def get_workspace(download_id):
+    """Get the workspace directory for a download"""
+    return os.path.join(workspaces_dir, download_id)
+
+def remove_workspace(download_id):
+    """Delete a download's workspace and any partial data in it"""
+    workspace = get_workspace(download_id)
+    if os.path.exists(workspace):
+        shutil.rmtree(workspace, ignore_errors=True)
+        debug_print(f'Removed workspace: {workspace}')
+
+def is_running(download):
+    """Check whether a download still occupies a worker slot"""
+    return not (download.get('completed') or download.get('error') or download.get('cancelled'))
+
+def cancel_download(download_id, reason='cancelled'):
+    """Cancel a running download, killing its ffmpeg child and deleting partial data"""
+    key = download_id_to_key.get(download_id)
+    download = active_downloads.get(key) if key else None
+    if not download or download['download_id'] != download_id:
+        return None
+
+    if not is_running(download):
+        return False
+
+    download['cancelled'] = True
+    download['error'] = f'Download {reason}'
+    download['last_update'] = time.time()
+    download['cancel_token'].cancel(reason)
+    if scheduler.discard(download_id):
+        download['trace'].end('queue', cancelled=True)
+    debug_print(json.dumps({
+        'status': 'cancelled',
+        'download_id': download_id,
+        'reason': reason
+    }))
+
+    # The worker may still be writing; it removes the workspace once it stops
+    cleanup_download(key, download_id)
+    return True
+
+def cleanup_download(key, download_id):
     """Clean up a download and its resources"""
-    debug_print(f'Cleaning up download: {url} ({download_id})')
+    debug_print(f'Cleaning up download: {key} ({download_id})')
     
-    if url in active_downloads:
-        download = active_downloads[url]
+    if key in active_downloads:
+        download = active_downloads[key]
         
-        # Only clean up if the download is completed or errored
-        if download.get('completed') or download.get('error'):
+        # Only clean up if the download is completed, errored or cancelled
+        if not is_running(download):
             # Clean up temporary files
-            if 'filename' in download and download['filename']:
+            for name in download.get('objects', {}).values():
                 try:
-                    filepath = os.path.join(downloads_dir, download['filename'])
-                    if os.path.exists(filepath):
-                        debug_print(f'Keeping completed file: {filepath}')
+                    filepath = artifact_store.local_path(name)
+                    if filepath and os.path.exists(filepath):
+                        debug_print(f'Keeping completed file until storage janitor evicts it: {filepath}')
                 except Exception as e:
                     debug_print(f'Error accessing file: {str(e)}')
             
-            # Clean up partial files
-            try:
-                for file in os.listdir(downloads_dir):
-                    if '.part' in file or '.temp' in file:
-                        filepath = os.path.join(downloads_dir, file)
-                        os.unlink(filepath)
-                        debug_print(f'Cleaned up partial file: {filepath}')
-            except Exception as e:
-                debug_print(f'Error cleaning up partial files: {str(e)}')
+            # Partial files are removed with the workspace when the worker stops
             
             # Keep the download info for a while to allow progress checks
             def delayed_cleanup():
                 time.sleep(CLEANUP_DELAY)
-                active_downloads.pop(url, None)
-                download_id_to_url.pop(download_id, None)
-                debug_print(f'Download info cleaned up after delay: {url} ({download_id})')
+                if active_downloads.get(key) is download:
+                    active_downloads.pop(key, None)
+                download_id_to_key.pop(download_id, None)
+                debug_print(f'Download info cleaned up after delay: {key} ({download_id})')
             
             cleanup_thread = threading.Thread(target=delayed_cleanup)
             cleanup_thread.daemon = True
             cleanup_thread.start()
         else:
-            debug_print(f'Skipping cleanup for incomplete download: {url} ({download_id})')
+            debug_print(f'Skipping cleanup for incomplete download: {key} ({download_id})')
 
 def monitor_downloads():
     """Monitor downloads for stalls and timeouts"""
     while True:
         current_time = time.time()
         
-        for url, download in list(active_downloads.items()):
+        for key, download in list(active_downloads.items()):
             # Check for stalls and timeouts
             is_stalled = current_time - download['last_update'] > PROGRESS_TIMEOUT
-            is_timed_out = current_time - download['start_time'] > DOWNLOAD_TIMEOUT
+            # Running jobs are only timed out when they stop making progress, so long videos
+            # and throttled transfers can take as long as they need
+            is_timed_out = not download.get('queued') and current_time - download['last_update'] > DOWNLOAD_STALL_TIMEOUT
             is_errored = download.get('error')
             is_completed = download.get('completed')
+
+            # Timed out downloads are stopped, not just cleaned up
+            if is_timed_out and is_running(download):
+                cancel_download(download['download_id'], 'timed out')
+                continue
+            
+            # Unclaimed prefetches are kept until they expire, even while still queued
+            if download.get('speculative'):
+                if current_time - download['created_at'] > PREFETCH_TTL:
+                    discard_prefetch(download, 'expired')
+                continue
+
+            if download.get('queued') and is_running(download):
+                continue
             
             if is_stalled or is_timed_out or is_errored or is_completed:
                 debug_print(json.dumps({
                     'status': 'cleanup_needed',
-                    'url': url,
+                    'key': key,
                     'is_stalled': is_stalled,
                     'is_timed_out': is_timed_out,
                     'is_errored': is_errored,
                     'is_completed': is_completed
                 }))
-                cleanup_download(url, download['download_id'])
+                cleanup_download(key, download['download_id'])
         
         time.sleep(10)  # Check every 10 seconds
 
@@ -122,55 +296,508 @@ def monitor_downloads():
 monitor_thread = threading.Thread(target=monitor_downloads, daemon=True)
 monitor_thread.start()
 
-def get_video_info(url, platform):
-    """Get video information without downloading"""
-    try:
-        import yt_dlp
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True,
+def cache_video_info(key, info):
+    """Keep the metadata needed for scheduling decisions"""
+    formats = [{
+        'format_id': f.get('format_id'),
+        'ext': f.get('ext'),
+        'vcodec': f.get('vcodec'),
+        'acodec': f.get('acodec'),
+        'filesize': f.get('filesize'),
+        'filesize_approx': f.get('filesize_approx')
+    } for f in info.get('formats') or []]
+
+    with video_info_cache_lock:
+        video_info_cache[key] = {
+            'duration': info.get('duration'),
+            'thumbnail': info.get('thumbnail'),
+            'formats': formats,
+            'cached_at': time.time()
         }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            if platform.lower() == 'youtube':
-                return {
-                    'title': info.get('title'),
-                    'duration': info.get('duration'),
-                    'view_count': info.get('view_count'),
-                    'thumbnail': info.get('thumbnail'),
-                    'channel': info.get('uploader'),
-                    'description': info.get('description'),
-                    'upload_date': info.get('upload_date'),
-                    'platform': 'youtube'
-                }
-            elif platform.lower() == 'tiktok':
-                return {
-                    'title': info.get('title', 'TikTok Video'),
-                    'duration': info.get('duration'),
-                    'view_count': info.get('view_count'),
-                    'thumbnail': info.get('thumbnail'),
-                    'channel': info.get('uploader'),
-                    'description': info.get('description'),
-                    'upload_date': info.get('upload_date'),
-                    'platform': 'tiktok',
-                    'like_count': info.get('like_count'),
-                    'repost_count': info.get('repost_count'),
-                    'comment_count': info.get('comment_count')
-                }
+        video_info_cache.move_to_end(key)
+        while len(video_info_cache) > VIDEO_INFO_CACHE_SIZE:
+            video_info_cache.popitem(last=False)
+
+def get_cached_video_info(key):
+    """Get cached scheduling metadata for a video key if it is still fresh"""
+    with video_info_cache_lock:
+        cached = video_info_cache.get(key)
+        if cached and time.time() - cached['cached_at'] < VIDEO_INFO_CACHE_TTL:
+            return cached
+        video_info_cache.pop(key, None)
         return None
+
+def probe_video_info(url, key):
+    """Extract metadata for scheduling when none is cached"""
+    cached = get_cached_video_info(key)
+    if cached:
+        return cached
+
+    with probe_semaphore:
+        try:
+            import yt_dlp
+            ydl_opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'socket_timeout': 15,
+            }
+            extract_url, ie_key = route_for_extractor(url)
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(extract_url, download=False, ie_key=ie_key)
+            if info:
+                cache_video_info(key, info)
+        except Exception as e:
+            debug_print(f'Error probing video info: {str(e)}')
+    return get_cached_video_info(key)
+
+def extract_video_info(url, platform, timeout=None, key=None):
+    """
+    Get video information without downloading, raising on failure
+    key is the video's cache key when the caller has already routed the URL
+    """
+    import yt_dlp
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': True,
+    }
+    if timeout:
+        # A retried extraction would outlive the caller's timeout and hold its worker
+        ydl_opts['socket_timeout'] = timeout
+        ydl_opts['extractor_retries'] = 0
+    extract_url, ie_key = route_for_extractor(url)
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(extract_url, download=False, ie_key=ie_key)
+        if info:
+            cache_video_info(key or url_key(url), info)
+        
+        if platform.lower() == 'youtube':
+            return {
+                'title': info.get('title'),
+                'duration': info.get('duration'),
+                'view_count': info.get('view_count'),
+                'thumbnail': info.get('thumbnail'),
+                'channel': info.get('uploader'),
+                'description': info.get('description'),
+                'upload_date': info.get('upload_date'),
+                'platform': 'youtube'
+            }
+        elif platform.lower() == 'tiktok':
+            return {
+                'title': info.get('title', 'TikTok Video'),
+                'duration': info.get('duration'),
+                'view_count': info.get('view_count'),
+                'thumbnail': info.get('thumbnail'),
+                'channel': info.get('uploader'),
+                'description': info.get('description'),
+                'upload_date': info.get('upload_date'),
+                'platform': 'tiktok',
+                'like_count': info.get('like_count'),
+                'repost_count': info.get('repost_count'),
+                'comment_count': info.get('comment_count')
+            }
+    return None
+
+def get_video_info(url, platform, timeout=None, key=None):
+    """Get video information without downloading"""
+    try:
+        return extract_video_info(url, platform, timeout, key)
     except Exception as e:
         debug_print(f'Error getting video info: {str(e)}')
         return None
 
+def find_thumbnail_url(platform, video_id, refresh=False):
+    """
+    Get the upstream thumbnail URL of a video, extracting its metadata if needed
+    With refresh the metadata is always extracted again, for cached URLs that have expired
+    """
+    key = f'{platform}:{video_id}'
+    if not refresh:
+        # Thumbnail URLs don't expire with the scheduling metadata
+        with video_info_cache_lock:
+            cached = video_info_cache.get(key)
+        if cached and cached.get('thumbnail'):
+            return cached['thumbnail']
+
+        if platform == 'youtube':
+            return f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg'
+
+    if platform == 'youtube':
+        url = f'https://www.youtube.com/watch?v={video_id}'
+    else:
+        url = f'https://www.tiktok.com/@_/video/{video_id}'
+    info = extract_video_info(url, platform, THUMBNAIL_EXTRACT_TIMEOUT, key)
+    if not info or not info.get('thumbnail'):
+        raise ThumbnailError('Video has no thumbnail')
+    return info['thumbnail']
+
+def project_video_info(info, key, fields):
+    """Keep only the requested fields of a video info result"""
+    projected = {}
+    for field in fields:
+        if field == 'formats':
+            cached = get_cached_video_info(key)
+            projected['formats'] = cached['formats'] if cached else []
+        else:
+            projected[field] = info.get(field)
+    return projected
+
+def iter_batch_video_info(items, fields, deadline, timeout):
+    """Extract info for many URLs in parallel, yielding per-item results as they finish"""
+    tasks = {}
+    invalid = []
+    for index, item in enumerate(items):
+        url = item.get('url', '') if isinstance(item, dict) else ''
+        platform = item.get('platform', '') if isinstance(item, dict) else ''
+        if url:
+            # Short links are resolved on the executor during extraction
+            platform = detect_platform(url) or platform
+        if not url or platform.lower() not in ['youtube', 'tiktok']:
+            invalid.append(index)
+            continue
+        tasks[index] = (lambda url=url, platform=platform: extract_video_info(url, platform, timeout))
+
+    for index in invalid:
+        yield {
+            'index': index,
+            'status': 'error',
+            'message': 'Missing url or invalid platform'
+        }
+
+    for index, status, value in run_with_deadline(info_executor, tasks, deadline, timeout, BATCH_MAX_IN_FLIGHT):
+        result = {'index': index, 'url': items[index]['url'], 'status': status}
+        if status == SUCCESS and value:
+            result['data'] = project_video_info(value, url_key(items[index]['url']), fields)
+        elif status == SUCCESS:
+            result['status'] = 'error'
+            result['message'] = 'Could not fetch video information'
+        elif value:
+            result['message'] = value
+        yield result
+
+def make_progress_callback(download_info):
+    """Track progress of a running download and throttle it through the governor"""
+    download_id = download_info['download_id']
+    token = download_info['cancel_token']
+    last = {'filename': None, 'bytes': 0}
+
+    def on_progress(d):
+        if d.get('status') != 'downloading':
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        if d.get('filename') != last['filename']:
+            last['filename'] = d.get('filename')
+            last['bytes'] = 0
+        delta = downloaded - last['bytes']
+        last['bytes'] = downloaded
+
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total:
+            download_info['progress'] = min(99, downloaded * 100 / total)
+        download_info['last_update'] = time.time()
+        governor.throttle(download_id, delta, token.check)
+
+    return on_progress
+
+def submit_download(download_info, cost, delay=0):
+    """Queue a download with the scheduler"""
+    download_info['cost'] = cost
+    download_info['trace'].start('queue', attempt=download_info['attempts'] + 1, delay=round(delay, 1))
+    download_info['lane'] = scheduler.submit(
+        download_info['download_id'],
+        cost,
+        download_info['priority'],
+        download_info['client_id'],
+        download_info['platform'].lower(),
+        delay
+    )
+
+def estimate_job(info, formats):
+    """Estimate the transfer and peak disk usage of a job producing all the given formats"""
+    cost = estimate_job_cost(info, source_format(formats))
+    # MP3 output is written next to the source, whatever else the job produces
+    disk_format = 'mp3' if 'mp3' in formats else source_format(formats)
+    return cost, estimate_disk_usage(cost, info, disk_format)
+
+def schedule_download(download_info, info):
+    """Estimate a download's cost and disk usage from metadata and queue it"""
+    cost, download_info['disk_estimate'] = estimate_job(info, download_info['formats'])
+    submit_download(download_info, cost)
+
+def create_download(url, key, platform, formats, priority, client_id, speculative=False):
+    """
+    Register a download and queue it once its cost is known
+    url is the canonical URL and key its cache and deduplication key
+    The source is fetched once and every format in formats is derived from it
+    """
+    # Create download ID and initialize tracking
+    # Millisecond timestamps collide when two requests arrive together
+    download_id = uuid.uuid4().hex
+    download_info = {
+        'download_id': download_id,
+        'key': key,
+        'url': url,
+        'platform': platform,
+        'format': formats[0],
+        'formats': formats,
+        'progress': 0,
+        'start_time': time.time(),
+        'last_update': time.time(),
+        'completed': False,
+        'cancelled': False,
+        'error': None,
+        'filename': None,
+        'files': {},
+        'objects': {},
+        'queued': True,
+        'priority': priority,
+        'client_id': client_id,
+        'speculative': speculative,
+        'created_at': time.time(),
+        'lane': None,
+        'cost': None,
+        'disk_estimate': None,
+        'attempts': 0,
+        'error_category': None,
+        'cancel_token': CancelToken(),
+        'trace': JobTrace()
+    }
+
+    # Store in tracking maps
+    active_downloads[key] = download_info
+    download_id_to_key[download_id] = key
+
+    # Estimate job cost and queue it once metadata is known
+    def do_schedule():
+        with download_info['trace'].span('probe'):
+            info = probe_video_info(url, key)
+        if download_info['cancelled']:
+            return
+        schedule_download(download_info, info)
+
+    cached = get_cached_video_info(key)
+    if cached:
+        schedule_download(download_info, cached)
+    else:
+        threading.Thread(target=do_schedule, daemon=True).start()
+
+    return download_info
+
+def resolve_platform(url, platform):
+    """
+    Canonicalize a URL and detect its platform, falling back to the given one
+    Returns (url, platform, key) so callers never need to route the URL again
+    """
+    routed = route_url(url)
+    if routed:
+        return routed.url, routed.platform, routed.key
+    return url.strip(), platform, url.strip()
+
+def remember_client_format(client_id, format_type):
+    """Remember a client's last chosen format for speculative prefetch"""
+    with client_last_format_lock:
+        client_last_format[client_id] = format_type.lower()
+        client_last_format.move_to_end(client_id)
+        while len(client_last_format) > CLIENT_FORMAT_CACHE_SIZE:
+            client_last_format.popitem(last=False)
+
+def maybe_prefetch(url, key, platform, client_id):
+    """Start fetching a video in the bulk lane before the client asks for it"""
+    if not SPECULATIVE_PREFETCH or platform.lower() not in breakers:
+        return None
+
+    existing = active_downloads.get(key)
+    if existing and (is_running(existing) or existing.get('completed')):
+        return None
+    if breakers[platform.lower()].is_open():
+        return None
+
+    # Stay within the prefetch budget
+    prefetching = sum(1 for d in list(active_downloads.values()) if d.get('speculative') and is_running(d))
+    if prefetching >= PREFETCH_MAX_JOBS:
+        return None
+
+    with client_last_format_lock:
+        format_type = client_last_format.get(client_id, PREFETCH_DEFAULT_FORMAT)
+    info = get_cached_video_info(key)
+    cost, required = estimate_job(info, [format_type])
+    if cost is None or cost > PREFETCH_MAX_BYTES:
+        return None
+    if not disk_quota.can_fit(required):
+        return None
+
+    download_info = create_download(url, key, platform, [format_type], 'low', None, speculative=True)
+    debug_print(json.dumps({
+        'status': 'prefetch_started',
+        'download_id': download_info['download_id'],
+        'url': url,
+        'format': format_type
+    }))
+    return download_info
+
+def claim_prefetch(download, priority, client_id):
+    """Hand a speculative download over to the client that requested it"""
+    download['speculative'] = False
+    download['priority'] = priority
+    download['client_id'] = client_id
+    download['last_update'] = time.time()
+
+    # Move a still queued job into the client's lane
+    if download.get('queued') and scheduler.discard(download['download_id']):
+        download['trace'].end('queue', claimed=True)
+        submit_download(download, download.get('cost'))
+    else:
+        # A running job now counts against the client and transfers at its priority
+        scheduler.reassign(download['download_id'], client_id)
+        governor.update(download['download_id'], client_id, priority)
+
+    debug_print(json.dumps({
+        'status': 'prefetch_claimed',
+        'download_id': download['download_id'],
+        'progress': download.get('progress', 0)
+    }))
+
+def discard_prefetch(download, reason):
+    """Stop an unclaimed speculative download and remove its output"""
+    download['speculative'] = False
+    if is_running(download):
+        cancel_download(download['download_id'], reason)
+        return
+
+    if download.get('completed'):
+        for name in download['objects'].values():
+            remove_artifact(name)
+    download['completed'] = False
+    download['error'] = f'Prefetch {reason}'
+    cleanup_download(download['key'], download['download_id'])
+
+def run_download(download_id):
+    """Run a scheduled download on a worker thread"""
+    key = download_id_to_key.get(download_id)
+    download_info = active_downloads.get(key) if key else None
+    if not download_info or download_info['download_id'] != download_id:
+        return
+    if download_info['cancelled']:
+        return
+
+    download_info['trace'].end('queue')
+    download_info['queued'] = False
+    download_info['attempts'] += 1
+    download_info['start_time'] = time.time()
+    download_info['last_update'] = time.time()
+
+    # Reserve disk space for the whole job before it starts
+    if not disk_quota.reserve(download_id, download_info['disk_estimate']):
+        download_info['error'] = 'Not enough storage space for this download'
+        download_info['error_category'] = 'storage'
+        download_info['last_update'] = time.time()
+        debug_print(json.dumps({
+            'status': 'error',
+            'download_id': download_id,
+            'category': 'storage',
+            'required_bytes': download_info['disk_estimate']
+        }))
+        return
+
+    url = download_info['url']
+    workspace = get_workspace(download_id)
+    breaker = breakers[download_info['platform'].lower()]
+    governor.register(download_id, download_info['client_id'], download_info['priority'])
+    try:
+        platform = download_info['platform']
+        download_func = youtube_download if platform.lower() == 'youtube' else tiktok_download
+        trace = download_info['trace']
+        with profiler.profile(download_id, platform.lower()) as profile_path:
+            if profile_path:
+                trace.profile = os.path.basename(profile_path)
+            files = download_func(url, download_info['formats'], workspace, download_info['cancel_token'],
+                                  make_progress_callback(download_info), trace)
+        
+        if files:
+            # Publish the finished files from the job workspace
+            download_info['cancel_token'].check()
+            with trace.span('publish', files=len(files), store=artifact_store.name):
+                objects = {}
+                for format_type, filename in files.items():
+                    source_path = os.path.join(workspace, filename)
+                    name = artifact_store.object_name(download_info['key'], format_type, filename)
+                    trace.add_bytes(os.path.getsize(source_path), 'publish')
+                    artifact_store.put(name, source_path, download_info['cancel_token'].check)
+                    if artifact_store.local_path(name):
+                        disk_quota.add_file(name)
+                    objects[format_type] = name
+            download_info['files'] = files
+            download_info['objects'] = objects
+            download_info['filename'] = files[download_info['format']]
+            download_info['completed'] = True
+            download_info['progress'] = 100
+            breaker.record_success()
+        else:
+            download_info['error'] = 'Download failed'
+            breaker.record_neutral()
+        
+    except JobCancelled:
+        breaker.record_neutral()
+        debug_print(f'Download stopped: {url} ({download_id})')
+    except UpstreamError as e:
+        download_info['error_category'] = e.category
+        if e.retryable:
+            breaker.record_failure(e.category)
+        else:
+            breaker.record_neutral()
+
+        if e.retryable and download_info['attempts'] < JOB_MAX_ATTEMPTS and not download_info['cancelled']:
+            # Requeue with backoff instead of holding the worker in retries
+            delay = RETRY_BASE_DELAY + backoff_delay(download_info['attempts'] - 1, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+            download_info['queued'] = True
+            download_info['last_error'] = str(e)
+            submit_download(download_info, download_info.get('cost'), delay)
+            debug_print(json.dumps({
+                'status': 'retry_scheduled',
+                'download_id': download_id,
+                'category': e.category,
+                'attempt': download_info['attempts'],
+                'delay': round(delay, 1)
+            }))
+        else:
+            download_info['error'] = str(e)
+            debug_print(json.dumps({
+                'status': 'error',
+                'category': e.category,
+                'error': str(e)
+            }))
+    except Exception as e:
+        breaker.record_neutral()
+        download_info['error'] = str(e)
+        debug_print(json.dumps({
+            'status': 'error',
+            'error': str(e)
+        }))
+    finally:
+        disk_quota.release(download_id)
+        governor.unregister(download_id)
+        download_info['last_update'] = time.time()
+        remove_workspace(download_id)
+
+# Start download workers
+scheduler = DownloadScheduler(run_download, MAX_CONCURRENT_DOWNLOADS,
+                              client_limit=governor.client_max_running,
+                              gates=breakers)
+scheduler.start()
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'ok',
         'timestamp': time.time(),
-        'temp_dir': downloads_dir
+        'temp_dir': downloads_dir,
+        'scheduler': scheduler.snapshot(),
+        'bandwidth': governor.snapshot(),
+        'platforms': {name: breaker.snapshot() for name, breaker in breakers.items()},
+        'storage': disk_quota.snapshot(),
+        'artifact_store': artifact_store.snapshot(),
+        'thumbnails': thumbnail_cache.snapshot()
     })
 
 @app.route('/api/download', methods=['POST'])
@@ -194,99 +821,130 @@ def download():
         # Extract parameters with defaults
         url = data.get('url', '')
         platform = data.get('platform', '')
-        format_type = data.get('format', '')
+        formats = data.get('formats') or data.get('format', '')
+        priority = data.get('priority', 'normal')
+        if isinstance(formats, str):
+            formats = [formats] if formats else []
 
         # Input validation
-        if not all([url, platform, format_type]):
+        if not all([url, formats]):
             return jsonify({
                 'status': 'error',
                 'message': 'Missing required parameters'
             }), 400
 
-        # Platform validation
+        # Platform detection and validation
+        url, platform, key = resolve_platform(url, platform)
         if platform.lower() not in ['youtube', 'tiktok']:
             return jsonify({
                 'status': 'error',
                 'message': 'Invalid platform. Must be "youtube" or "tiktok"'
             }), 400
 
-        # Format validation
-        if format_type.lower() not in ['mp3', 'mp4']:
+        # Format validation, one job can produce several formats
+        if (not isinstance(formats, list) or
+                not all(isinstance(f, str) and f.lower() in SUPPORTED_FORMATS for f in formats)):
             return jsonify({
                 'status': 'error',
                 'message': 'Invalid format. Must be "mp3" or "mp4"'
             }), 400
+        formats = list(dict.fromkeys(f.lower() for f in formats))
+
+        # Priority validation
+        if priority not in PRIORITIES:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid priority. Must be "high", "normal" or "low"'
+            }), 400
+
+        # Fail fast while the platform is refusing requests
+        breaker = breakers[platform.lower()]
+        if breaker.is_open():
+            response = jsonify({
+                'status': 'error',
+                'message': f'{platform} is temporarily unavailable. Please try again later.',
+                'retry_after': breaker.retry_after()
+            })
+            response.headers['Retry-After'] = str(breaker.retry_after())
+            return response, 503
+
+        # Check queued downloads limit
+        pending = sum(1 for d in list(active_downloads.values()) if is_running(d))
+        if pending >= MAX_CONCURRENT_DOWNLOADS + MAX_QUEUED_DOWNLOADS:
+            return jsonify({
+                'status': 'error',
+                'message': 'Too many queued downloads. Please try again later.'
+            }), 429
 
-        # Check concurrent downloads limit
-        if len(active_downloads) >= MAX_CONCURRENT_DOWNLOADS:
+        # Check per-client downloads limit
+        client_id = get_client_id()
+        client_limit = governor.client_max_pending(client_id)
+        client_pending = sum(1 for d in list(active_downloads.values())
+                             if is_running(d) and d.get('client_id') == client_id)
+        if client_limit and client_pending >= client_limit:
             return jsonify({
                 'status': 'error',
-                'message': 'Too many concurrent downloads. Please try again later.'
+                'message': 'Too many downloads for this client. Please try again later.'
             }), 429
 
+        remember_client_format(client_id, formats[0])
+
+        # Attach to a matching speculative download instead of starting over
+        existing = active_downloads.get(key)
+        if existing and existing.get('speculative') and not existing.get('error'):
+            if existing['formats'] == formats:
+                claim_prefetch(existing, priority, client_id)
+                return jsonify({
+                    'status': 'started',
+                    'download_id': existing['download_id'],
+                    'priority': priority
+                })
+            discard_prefetch(existing, 'superseded')
+
+        # Check the estimated size against free space and quota when metadata is known
+        cached = get_cached_video_info(key)
+        if cached:
+            _, required = estimate_job(cached, formats)
+            if not disk_quota.can_fit(required):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Not enough storage space for this download'
+                }), 507
+
         # Check if URL is already being downloaded
-        if url in active_downloads:
-            download = active_downloads[url]
+        if key in active_downloads:
+            download = active_downloads[key]
             current_time = time.time()
             
-            # If download is completed or errored, clean it up and allow new download
-            if (download.get('completed') or 
-                download.get('error') or 
+            # If download is completed, errored or cancelled, clean it up and allow new download
+            if (not is_running(download) or
                 current_time - download['last_update'] > PROGRESS_TIMEOUT):
-                cleanup_download(url, download['download_id'])
-            else:
-                # Return existing download ID if download is in progress
+                cleanup_download(key, download['download_id'])
+            elif set(formats) <= set(download['formats']):
+                # Return existing download ID if it produces every requested format
                 return jsonify({
                     'status': 'in_progress',
                     'download_id': download['download_id'],
+                    'formats': download['formats'],
                     'message': 'Download already in progress'
                 })
-
-        # Create download ID and initialize tracking
-        download_id = str(int(time.time() * 1000))
-        download_info = {
-            'download_id': download_id,
-            'url': url,
-            'platform': platform,
-            'format': format_type,
-            'progress': 0,
-            'start_time': time.time(),
-            'last_update': time.time(),
-            'completed': False,
-            'error': None,
-            'filename': None
-        }
-
-        # Store in tracking maps
-        active_downloads[url] = download_info
-        download_id_to_url[download_id] = url
-
-        # Start download in a separate thread
-        def do_download():
-            try:
-                download_func = youtube_download if platform.lower() == 'youtube' else tiktok_download
-                filename = download_func(url, format_type, downloads_dir)
-                
-                if filename:
-                    download_info['filename'] = filename
-                    download_info['completed'] = True
-                    download_info['progress'] = 100
-                else:
-                    download_info['error'] = 'Download failed'
-                
-            except Exception as e:
-                download_info['error'] = str(e)
-                debug_print(json.dumps({
+            else:
+                missing = [f for f in formats if f not in download['formats']]
+                return jsonify({
                     'status': 'error',
-                    'error': str(e)
-                }))
+                    'download_id': download['download_id'],
+                    'formats': download['formats'],
+                    'message': f'Download already in progress without {", ".join(missing)}. '
+                               'Please try again when it completes.'
+                }), 409
 
-        download_thread = threading.Thread(target=do_download)
-        download_thread.start()
+        download_info = create_download(url, key, platform, formats, priority, client_id)
 
         return jsonify({
             'status': 'started',
-            'download_id': download_id
+            'download_id': download_info['download_id'],
+            'priority': priority,
+            'formats': formats
         })
 
     except Exception as e:
@@ -296,6 +954,37 @@ def download():
             'message': str(e)
         }), 500
 
+def lookup_video_info(data, client_id, timeout=None):
+    """Look up video information for a request body, returning the response body and status code"""
+    url = data.get('url', '')
+    platform = data.get('platform', '')
+
+    if not url:
+        return {
+            'status': 'error',
+            'message': 'Missing required parameters'
+        }, 400
+
+    url, platform, key = resolve_platform(url, platform)
+    if not platform:
+        return {
+            'status': 'error',
+            'message': 'Could not detect platform'
+        }, 400
+
+    info = get_video_info(url, platform, timeout, key)
+    if info and data.get('prefetch', True):
+        maybe_prefetch(url, key, platform, client_id)
+    if info:
+        return {
+            'status': 'success',
+            'data': info
+        }, 200
+    return {
+        'status': 'error',
+        'message': 'Could not fetch video information'
+    }, 404
+
 @app.route('/api/video-info', methods=['POST'])
 def video_info():
     """Get video information endpoint"""
@@ -306,27 +995,73 @@ def video_info():
                 'message': 'Request must be JSON'
             }), 400
 
-        data = request.get_json()
-        url = data.get('url', '')
-        platform = data.get('platform', '')
+        body, status = lookup_video_info(request.get_json(), get_client_id())
+        return jsonify(body), status
 
-        if not all([url, platform]):
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/video-info/batch', methods=['POST'])
+def video_info_batch():
+    """Get video information for many URLs at once"""
+    try:
+        if not request.is_json:
+            return jsonify({
+                'status': 'error',
+                'message': 'Request must be JSON'
+            }), 400
+
+        data = request.get_json() or {}
+        items = data.get('items')
+        if items is None and isinstance(data.get('urls'), list):
+            items = [{'url': url, 'platform': data.get('platform', '')} for url in data['urls']]
+
+        if not isinstance(items, list) or not items:
             return jsonify({
                 'status': 'error',
                 'message': 'Missing required parameters'
             }), 400
 
-        info = get_video_info(url, platform)
-        if info:
+        if len(items) > MAX_BATCH_URLS:
             return jsonify({
-                'status': 'success',
-                'data': info
-            })
-        else:
+                'status': 'error',
+                'message': f'Too many URLs. Maximum is {MAX_BATCH_URLS}'
+            }), 400
+
+        fields = data.get('fields') or BATCH_DEFAULT_FIELDS
+        if not isinstance(fields, list):
             return jsonify({
                 'status': 'error',
-                'message': 'Could not fetch video information'
-            }), 404
+                'message': 'fields must be a list'
+            }), 400
+
+        try:
+            deadline = min(float(data.get('deadline', BATCH_DEADLINE)), MAX_BATCH_DEADLINE)
+            timeout = min(float(data.get('timeout', BATCH_ITEM_TIMEOUT)), deadline)
+        except (TypeError, ValueError):
+            return jsonify({
+                'status': 'error',
+                'message': 'deadline and timeout must be numbers'
+            }), 400
+
+        results = iter_batch_video_info(items, fields, deadline, timeout)
+
+        # Stream items as NDJSON as soon as each one completes
+        if data.get('stream'):
+            def generate():
+                for result in results:
+                    yield json.dumps(result) + '\n'
+            return Response(generate(), mimetype='application/x-ndjson')
+
+        ordered = sorted(results, key=lambda result: result['index'])
+        return jsonify({
+            'status': 'success',
+            'data': ordered,
+            'succeeded': sum(1 for result in ordered if result['status'] == SUCCESS)
+        })
 
     except Exception as e:
         return jsonify({
@@ -334,32 +1069,83 @@ def video_info():
             'message': str(e)
         }), 500
 
+def download_progress(download_id):
+    """Build the progress response body and status code of a download"""
+    key = download_id_to_key.get(download_id)
+    download = active_downloads.get(key) if key else None
+    if not download:
+        return {
+            'status': 'error',
+            'message': 'Download not found'
+        }, 404
+
+    if download.get('cancelled'):
+        status = 'cancelled'
+    elif download.get('error'):
+        status = 'error'
+    elif download.get('completed'):
+        status = 'completed'
+    elif download.get('queued'):
+        status = 'queued'
+    else:
+        status = 'downloading'
+
+    response = {
+        'status': status,
+        'progress': download.get('progress', 0),
+        'filename': download.get('filename'),
+        'error': download.get('error')
+    }
+    if len(download['formats']) > 1:
+        response['files'] = {
+            f: {'filename': filename, 'url': f'/api/download/{download_id}/file/{f}'}
+            for f, filename in download['files'].items()
+        }
+    if download.get('error_category'):
+        response['error_category'] = download['error_category']
+    if status == 'queued':
+        response['lane'] = download.get('lane')
+        response['queue_position'] = scheduler.position(download_id)
+        if download.get('attempts'):
+            response['attempts'] = download['attempts']
+            response['last_error'] = download.get('last_error')
+
+    return response, 200
+
 @app.route('/api/progress/<download_id>', methods=['GET'])
 def get_progress(download_id):
     """Get download progress"""
     try:
-        url = download_id_to_url.get(download_id)
-        if not url:
+        body, status = download_progress(download_id)
+        return jsonify(body), status
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/download/<download_id>', methods=['DELETE'])
+def delete_download(download_id):
+    """Cancel a download"""
+    try:
+        cancelled = cancel_download(download_id)
+        if cancelled is None:
             return jsonify({
                 'status': 'error',
                 'message': 'Download not found'
             }), 404
 
-        download = active_downloads.get(url)
-        if not download:
+        if not cancelled:
             return jsonify({
                 'status': 'error',
-                'message': 'Download not found'
-            }), 404
+                'message': 'Download already finished'
+            }), 409
 
-        response = {
-            'status': 'error' if download.get('error') else 'completed' if download.get('completed') else 'downloading',
-            'progress': download.get('progress', 0),
-            'filename': download.get('filename'),
-            'error': download.get('error')
-        }
-
-        return jsonify(response)
+        return jsonify({
+            'status': 'cancelled',
+            'download_id': download_id
+        })
 
     except Exception as e:
         return jsonify({
@@ -367,41 +1153,169 @@ def get_progress(download_id):
             'message': str(e)
         }), 500
 
-@app.route('/api/download/<download_id>/file', methods=['GET'])
-def get_file(download_id):
-    """Get downloaded file"""
+@app.route('/api/download/<download_id>/trace', methods=['GET'])
+def get_trace(download_id):
+    """Get the phase timeline of a download"""
     try:
-        url = download_id_to_url.get(download_id)
-        if not url:
+        key = download_id_to_key.get(download_id)
+        download = active_downloads.get(key) if key else None
+        if not download or download['download_id'] != download_id:
             return jsonify({
                 'status': 'error',
                 'message': 'Download not found'
             }), 404
 
-        download = active_downloads.get(url)
-        if not download:
+        return jsonify({
+            'status': 'success',
+            'download_id': download_id,
+            'platform': download['platform'],
+            'format': download['format'],
+            'formats': download['formats'],
+            'attempts': download.get('attempts', 0),
+            'data': download['trace'].to_dict()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/admin/profiling', methods=['GET', 'PUT'])
+def profiling_config():
+    """Get or change the share of jobs that run under the profiler"""
+    try:
+        if not is_admin_request():
             return jsonify({
                 'status': 'error',
-                'message': 'Download not found'
-            }), 404
+                'message': 'Forbidden'
+            }), 403
 
-        if not download.get('completed'):
+        if request.method == 'PUT':
+            if not request.is_json:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Request must be JSON'
+                }), 400
+            try:
+                config = profiler.configure(request.get_json() or {})
+            except ValueError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
+        else:
+            config = profiler.get_config()
+
+        return jsonify({
+            'status': 'success',
+            'data': config
+        })
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/admin/bandwidth', methods=['GET', 'PUT'])
+def bandwidth_config():
+    """Get or live-update bandwidth and per-client quota settings"""
+    try:
+        if not is_admin_request():
             return jsonify({
                 'status': 'error',
-                'message': 'Download not completed'
-            }), 400
+                'message': 'Forbidden'
+            }), 403
+
+        if request.method == 'PUT':
+            if not request.is_json:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Request must be JSON'
+                }), 400
+            try:
+                config = governor.configure(request.get_json() or {})
+            except ValueError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
+        else:
+            config = governor.get_config()
+
+        return jsonify({
+            'status': 'success',
+            'data': config
+        })
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
 
-        filepath = os.path.join(downloads_dir, download['filename'])
+def locate_file(download_id, format_type=None):
+    """
+    Find the file of a completed download
+    Returns (error, filename, name, filepath) where error is a response body and status code,
+    name is the file's name in the artifact store and filepath is None for remote stores
+    """
+    key = download_id_to_key.get(download_id)
+    download = active_downloads.get(key) if key else None
+    if not download:
+        return ({
+            'status': 'error',
+            'message': 'Download not found'
+        }, 404), None, None, None
+
+    if not download.get('completed'):
+        return ({
+            'status': 'error',
+            'message': 'Download not completed'
+        }, 400), None, None, None
+
+    format_type = (format_type or download['format']).lower()
+    filename = download['files'].get(format_type)
+    if not filename:
+        return ({
+            'status': 'error',
+            'message': 'Format not produced by this download'
+        }, 404), None, None, None
+
+    name = download['objects'][format_type]
+    filepath = artifact_store.local_path(name)
+    if filepath:
         if not os.path.exists(filepath):
-            return jsonify({
+            return ({
                 'status': 'error',
                 'message': 'File not found'
-            }), 404
+            }, 404), None, None, None
+        disk_quota.touch(name)
+    return None, filename, name, filepath
+
+@app.route('/api/download/<download_id>/file', methods=['GET'])
+@app.route('/api/download/<download_id>/file/<format_type>', methods=['GET'])
+def get_file(download_id, format_type=None):
+    """Get downloaded file, or one of the outputs of a multi-format download"""
+    try:
+        error, filename, name, filepath = locate_file(download_id, format_type)
+        if error:
+            body, status = error
+            return jsonify(body), status
+
+        if not filepath:
+            # Let clients fetch from the shared store directly instead of proxying the bytes
+            if STORAGE_REDIRECT:
+                return redirect(artifact_store.presigned_url(name, filename), 302)
+            response = Response(artifact_store.iter_file(name), mimetype='application/octet-stream')
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
 
         return send_file(
             filepath,
             as_attachment=True,
-            download_name=download['filename']
+            download_name=filename
         )
 
     except Exception as e:
@@ -410,5 +1324,49 @@ def get_file(download_id):
             'message': str(e)
         }), 500
 
+@app.route('/api/thumbnail/<video_id>', methods=['GET'])
+def get_thumbnail(video_id):
+    """Get a resized, cached thumbnail of a video"""
+    try:
+        platform = request.args.get('platform', '').lower()
+        if not platform:
+            # TikTok video IDs are long numbers, YouTube IDs are 11 characters
+            platform = 'tiktok' if video_id.isdigit() and len(video_id) > 11 else 'youtube'
+
+        try:
+            size = int(request.args.get('size', THUMBNAIL_DEFAULT_SIZE))
+        except ValueError:
+            size = None
+        if size not in THUMBNAIL_SIZES:
+            return jsonify({
+                'status': 'error',
+                'message': f'Invalid size. Must be one of {", ".join(str(s) for s in THUMBNAIL_SIZES)}'
+            }), 400
+
+        if not THUMBNAIL_VIDEO_ID.match(video_id) or platform not in ['youtube', 'tiktok']:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid video ID or platform'
+            }), 400
+
+        try:
+            data, etag, mimetype = thumbnail_cache.get(
+                f'{platform}:{video_id}', lambda refresh: find_thumbnail_url(platform, video_id, refresh), size)
+        except ThumbnailError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 502
+
+        response = send_file(io.BytesIO(data), mimetype=mimetype, etag=etag, max_age=THUMBNAIL_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={THUMBNAIL_MAX_AGE}, immutable'
+        return response
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=3002, debug=True)
@@ -0,0 +1,204 @@
+import time
+import threading
+
+# Relative share of bandwidth for each job priority
+PRIORITY_WEIGHTS = {'high': 2.0, 'normal': 1.0, 'low': 0.5}
+
+# Jobs that have not transferred for this long stop holding a share
+ACTIVE_WINDOW = 2.0  # seconds
+
+# Longest single sleep so cancellation stays responsive
+MAX_SLEEP_SLICE = 0.25  # seconds
+
+DEFAULT_CONFIG = {
+    'global_rate': 0,           # bytes/s for all downloads, 0 = unlimited
+    'client_rate': 0,           # bytes/s per client, 0 = unlimited
+    'client_max_running': 2,    # running downloads per client
+    'client_max_pending': 10,   # running + queued downloads per client
+    'client_overrides': {}      # client id -> any of the client_* settings
+}
+
+
+class TokenBucket:
+    """Token bucket that lets callers go into debt and tells them how long to wait"""
+
+    def __init__(self, rate, burst_seconds=1.0):
+        self.burst_seconds = burst_seconds
+        self.rate = 0
+        self.tokens = 0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        self._refill()
+        self.rate = rate
+        self.tokens = min(self.tokens, self.capacity)
+
+    @property
+    def capacity(self):
+        return self.rate * self.burst_seconds
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount):
+        """Take tokens and return the seconds to wait until the debt is repaid"""
+        if not self.rate:
+            return 0
+        self._refill()
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+class BandwidthGovernor:
+    """
+    Shares aggregate download bandwidth between jobs.
+    Every transferred chunk is charged to a global bucket, a per-client bucket
+    and a per-job bucket whose rate is the job's weighted share of the global
+    rate among jobs that are currently transferring.
+    Configuration can be changed at any time with configure().
+    """
+
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self.config = {**DEFAULT_CONFIG, 'client_overrides': {}}
+        self._global = TokenBucket(0)
+        self._clients = {}
+        self._jobs = {}
+        self.configure(config or {})
+
+    def configure(self, changes):
+        """Apply a partial configuration update and return the new configuration"""
+        validated = {}
+        for key, value in changes.items():
+            if key not in DEFAULT_CONFIG:
+                raise ValueError(f'Unknown bandwidth setting: {key}')
+            if key == 'client_overrides':
+                if not isinstance(value, dict) or not all(isinstance(v, dict) for v in value.values()):
+                    raise ValueError('client_overrides must map client ids to objects')
+                validated[key] = {str(k): dict(v) for k, v in value.items()}
+            else:
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                    raise ValueError(f'{key} must be a non-negative number')
+                validated[key] = value
+
+        with self._lock:
+            self.config.update(validated)
+            self._global.set_rate(self.config['global_rate'])
+            for client_id, bucket in self._clients.items():
+                bucket.set_rate(self._client_setting(client_id, 'client_rate'))
+            self._rebalance(time.monotonic())
+            return self.get_config()
+
+    def get_config(self):
+        return {**self.config, 'client_overrides': dict(self.config['client_overrides'])}
+
+    def _client_setting(self, client_id, key):
+        overrides = self.config['client_overrides'].get(client_id, {})
+        return overrides.get(key, self.config[key])
+
+    def has_overrides(self, client_id):
+        with self._lock:
+            return client_id in self.config['client_overrides']
+
+    def client_max_running(self, client_id):
+        with self._lock:
+            return self._client_setting(client_id, 'client_max_running') or None
+
+    def client_max_pending(self, client_id):
+        with self._lock:
+            return self._client_setting(client_id, 'client_max_pending') or None
+
+    def register(self, job_id, client_id, priority='normal'):
+        """Start accounting a job's transfer"""
+        with self._lock:
+            if client_id not in self._clients:
+                self._clients[client_id] = TokenBucket(self._client_setting(client_id, 'client_rate'))
+            self._jobs[job_id] = {
+                'client_id': client_id,
+                'weight': PRIORITY_WEIGHTS.get(priority, 1.0),
+                'bucket': TokenBucket(0),
+                'last_seen': 0,
+                'bytes': 0
+            }
+
+    def unregister(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if not job:
+                return
+            self._drop_client(job['client_id'])
+            self._rebalance(time.monotonic())
+
+    def update(self, job_id, client_id, priority='normal'):
+        """Move a registered job to another client and priority, keeping its accounting"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            previous = job['client_id']
+            if client_id not in self._clients:
+                self._clients[client_id] = TokenBucket(self._client_setting(client_id, 'client_rate'))
+            job['client_id'] = client_id
+            job['weight'] = PRIORITY_WEIGHTS.get(priority, 1.0)
+            self._drop_client(previous)
+            self._rebalance(time.monotonic())
+
+    def _drop_client(self, client_id):
+        """Forget a client's bucket once it has no jobs; the caller holds the lock"""
+        if not any(j['client_id'] == client_id for j in self._jobs.values()):
+            self._clients.pop(client_id, None)
+
+    def _rebalance(self, now):
+        """Give every active job its weighted share of the global rate"""
+        active = [job for job in self._jobs.values() if now - job['last_seen'] < ACTIVE_WINDOW]
+        total_weight = sum(job['weight'] for job in active)
+        global_rate = self.config['global_rate']
+        for job in self._jobs.values():
+            if global_rate and total_weight and job in active:
+                job['bucket'].set_rate(global_rate * job['weight'] / total_weight)
+            else:
+                job['bucket'].set_rate(0)
+
+    def throttle(self, job_id, amount, check=None):
+        """
+        Charge transferred bytes to a job, sleeping as long as its buckets require
+        check is called between sleeps and may raise to abort the wait
+        """
+        if amount <= 0:
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            now = time.monotonic()
+            job['last_seen'] = now
+            job['bytes'] += amount
+            self._rebalance(now)
+            wait = max(
+                self._global.consume(amount),
+                self._clients[job['client_id']].consume(amount),
+                job['bucket'].consume(amount)
+            )
+
+        deadline = time.monotonic() + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if check:
+                check()
+            time.sleep(min(remaining, MAX_SLEEP_SLICE))
+
+    def snapshot(self):
+        """Summarize current bandwidth accounting"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'global_rate': self.config['global_rate'],
+                'active_jobs': sum(1 for job in self._jobs.values() if now - job['last_seen'] < ACTIVE_WINDOW),
+                'clients': len(self._clients)
+            }
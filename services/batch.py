@@ -0,0 +1,71 @@
+import time
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED
+
+# Result statuses
+SUCCESS = 'success'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+
+def run_with_deadline(executor, tasks, deadline, timeout, max_in_flight=None):
+    """
+    Run tasks on an executor and yield (key, status, value) as each finishes.
+    tasks maps keys to callables. A task that has been running for longer than
+    timeout seconds, or is unfinished when the overall deadline (seconds from
+    now) passes, is reported as TIMEOUT and no longer waited for.
+    At most max_in_flight unfinished tasks are submitted at once, so a large
+    batch doesn't queue all of its work ahead of other callers. Timed out tasks
+    stop counting, so they never hold back the rest of the batch; tasks should
+    bound their own run time (e.g. with socket timeouts).
+    value is the task's return value, the error message, or None on timeout.
+    """
+    end = time.monotonic() + deadline
+    if max_in_flight is not None:
+        max_in_flight = max(1, max_in_flight)
+    started = {}
+    lock = threading.Lock()
+    queued = list(tasks.items())
+    queued.reverse()
+
+    def track(key, func):
+        def run():
+            with lock:
+                started[key] = time.monotonic()
+            return func()
+        return run
+
+    pending = {}
+    while pending or queued:
+        while queued and (max_in_flight is None or len(pending) < max_in_flight):
+            key, func = queued.pop()
+            pending[executor.submit(track(key, func))] = key
+
+        now = time.monotonic()
+        if now >= end:
+            break
+
+        # Stop waiting for tasks that have run past their own timeout
+        with lock:
+            expiries = {future: started[key] + timeout for future, key in pending.items() if key in started}
+        for future, expiry in expiries.items():
+            if expiry <= now and not future.done():
+                yield pending.pop(future), TIMEOUT, None
+        if not pending:
+            continue
+
+        next_expiry = min([end] + [expiry for future, expiry in expiries.items() if future in pending])
+        done, _ = wait(list(pending), timeout=max(0.01, next_expiry - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            key = pending.pop(future)
+            try:
+                yield key, SUCCESS, future.result()
+            except Exception as e:
+                yield key, ERROR, str(e)
+
+    # Whatever is left missed the overall deadline
+    for future, key in pending.items():
+        future.cancel()
+        yield key, TIMEOUT, None
+    for key, func in reversed(queued):
+        yield key, TIMEOUT, None
@@ -0,0 +1,121 @@
+import time
+import threading
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Per-platform circuit breaker.
+    Opens after failure_threshold upstream failures within window seconds.
+    After a cooldown one trial job is let through (half open): success closes
+    the breaker, failure reopens it with a doubled cooldown up to max_cooldown.
+    """
+
+    def __init__(self, name, failure_threshold=5, window=60, cooldown=30, max_cooldown=600):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.failures = []
+        self.last_error = None
+
+    def _update(self, now):
+        if self.state == OPEN and now >= self.opened_at + self.cooldown:
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+
+    def is_open(self):
+        """Check whether new jobs should be rejected outright"""
+        with self._lock:
+            self._update(time.time())
+            return self.state == OPEN
+
+    def retry_after(self):
+        """Seconds until the breaker lets a trial job through"""
+        with self._lock:
+            return self._retry_after(time.time())
+
+    def _retry_after(self, now):
+        if self.state != OPEN:
+            return 0
+        return max(0, int(self.opened_at + self.cooldown - now) + 1)
+
+    def available(self):
+        """Check whether a queued job may start now"""
+        with self._lock:
+            self._update(time.time())
+            if self.state == CLOSED:
+                return True
+            return self.state == HALF_OPEN and not self.trial_in_flight
+
+    def on_start(self):
+        """
+        Mark a job as started, making it the trial if the breaker is half open
+        Returns True if the job is the trial
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def on_finish(self):
+        """Release the trial of a job that ended without recording an outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.cooldown = self.base_cooldown
+            self.trial_in_flight = False
+            self.failures = []
+
+    def record_failure(self, error=None):
+        """Record an upstream failure such as a 429, 403 or network error"""
+        with self._lock:
+            now = time.time()
+            self._update(now)
+            self.last_error = error
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._open(now)
+                return
+
+            self.failures = [t for t in self.failures if now - t < self.window]
+            self.failures.append(now)
+            if self.state == CLOSED and len(self.failures) >= self.failure_threshold:
+                self._open(now)
+
+    def record_neutral(self):
+        """Record a finished job that says nothing about upstream health"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.trial_in_flight = False
+        self.failures = []
+
+    def snapshot(self):
+        with self._lock:
+            now = time.time()
+            self._update(now)
+            return {
+                'state': self.state,
+                'recent_failures': len(self.failures),
+                'cooldown': self.cooldown,
+                'retry_after': self._retry_after(now),
+                'last_error': self.last_error
+            }
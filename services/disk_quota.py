@@ -0,0 +1,210 @@
+import os
+import time
+import shutil
+import threading
+
+# Reserved when a job's size cannot be estimated
+DEFAULT_RESERVATION = 200 * 1024 * 1024  # 200MB
+
+# MP3 output written at 192kbit/s
+MP3_BYTES_PER_SECOND = 24 * 1024
+
+
+def estimate_disk_usage(transfer_bytes, info, format_type):
+    """
+    Estimate the peak disk usage of a job from its transfer estimate
+    MP3 jobs hold the downloaded source and the converted output at once
+    """
+    if transfer_bytes is None:
+        return DEFAULT_RESERVATION
+    if format_type.lower() == 'mp3':
+        duration = (info or {}).get('duration') or 0
+        return transfer_bytes + int(duration * MP3_BYTES_PER_SECOND)
+    return transfer_bytes
+
+
+class DiskQuota:
+    """
+    Space reservations and retention for completed files in a directory.
+    Jobs reserve their estimated size before starting. Completed files count
+    against quota_bytes and are evicted least recently used first, or once
+    they have not been accessed for ttl seconds. Files accessed within
+    min_retention seconds are never evicted. Files may sit in subdirectories
+    and are named by their '/'-separated path relative to directory.
+    """
+
+    def __init__(self, directory, quota_bytes, min_free_bytes, ttl, min_retention=300, ignore=()):
+        self.directory = directory
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.ttl = ttl
+        self.min_retention = min_retention
+        self.ignore = set(ignore)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._reservations = {}
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.scan()
+
+    def scan(self):
+        """Resynchronize tracked files with the directory contents"""
+        found = {}
+        for root, dirs, files in os.walk(self.directory):
+            # Hidden directories hold job workspaces, not completed files
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            relative = os.path.relpath(root, self.directory)
+            for filename in files:
+                name = filename if relative == '.' else f"{relative.replace(os.sep, '/')}/{filename}"
+                if name in self.ignore or filename.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, filename))
+                except OSError:
+                    continue
+                found[name] = {'size': stat.st_size, 'last_access': stat.st_mtime}
+
+        with self._lock:
+            for name, tracked in found.items():
+                previous = self._files.get(name)
+                if previous and previous['size'] == tracked['size']:
+                    tracked['last_access'] = max(tracked['last_access'], previous['last_access'])
+            self._files = found
+
+    def _usage(self):
+        return sum(f['size'] for f in self._files.values())
+
+    def _reserved(self):
+        return sum(self._reservations.values())
+
+    def _fits(self, size):
+        used = self._usage() + self._reserved()
+        free = shutil.disk_usage(self.directory).free - self._reserved()
+        return used + size <= self.quota_bytes and free - size >= self.min_free_bytes
+
+    def can_fit(self, size):
+        """Check whether a job of this size could be admitted, counting evictable files"""
+        with self._lock:
+            now = time.time()
+            evictable = sum(f['size'] for f in self._files.values()
+                            if now - f['last_access'] >= self.min_retention)
+            used = self._usage() - evictable + self._reserved()
+            free = shutil.disk_usage(self.directory).free + evictable - self._reserved()
+            return used + size <= self.quota_bytes and free - size >= self.min_free_bytes
+
+    def reserve(self, job_id, size):
+        """Reserve space for a job, evicting old files if needed"""
+        with self._lock:
+            if not self._fits(size):
+                self._evict(lambda: self._fits(size))
+            if not self._fits(size):
+                return False
+            self._reservations[job_id] = size
+            return True
+
+    def release(self, job_id):
+        with self._lock:
+            self._reservations.pop(job_id, None)
+
+    def path(self, filename):
+        return os.path.join(self.directory, *filename.split('/'))
+
+    def add_file(self, filename):
+        """Start tracking a completed file"""
+        path = self.path(filename)
+        with self._lock:
+            self._files[filename] = {'size': os.path.getsize(path), 'last_access': time.time()}
+
+    def remove_file(self, filename):
+        """Delete a tracked file right away"""
+        with self._lock:
+            if filename in self._files:
+                return self._remove(filename)
+            return False
+
+    def touch(self, filename):
+        """Mark a file as recently used"""
+        with self._lock:
+            if filename in self._files:
+                self._files[filename]['last_access'] = time.time()
+
+    def _remove(self, filename):
+        info = self._files.pop(filename)
+        path = self.path(filename)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # Still open elsewhere; retry on the next pass
+            self._files[filename] = info
+            return False
+        self._prune(os.path.dirname(path))
+        self.evicted_files += 1
+        self.evicted_bytes += info['size']
+        return True
+
+    def _prune(self, directory):
+        """Remove empty subdirectories left behind by a removed file"""
+        root = os.path.abspath(self.directory)
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def _evict(self, satisfied):
+        """Remove least recently used files until satisfied() or nothing is evictable"""
+        now = time.time()
+        candidates = sorted(
+            (name for name, f in self._files.items() if now - f['last_access'] >= self.min_retention),
+            key=lambda name: self._files[name]['last_access']
+        )
+        for name in candidates:
+            if satisfied():
+                break
+            self._remove(name)
+
+    def collect(self):
+        """Evict expired files and enforce the quota, returning the number removed"""
+        self.scan()
+        with self._lock:
+            before = self.evicted_files
+            now = time.time()
+            for name, f in list(self._files.items()):
+                if now - f['last_access'] >= self.ttl:
+                    self._remove(name)
+            self._evict(lambda: self._usage() + self._reserved() <= self.quota_bytes)
+            return self.evicted_files - before
+
+    def start_janitor(self, interval, log=None):
+        """Run collect() every interval seconds on a daemon thread"""
+        def janitor():
+            while True:
+                time.sleep(interval)
+                try:
+                    removed = self.collect()
+                    if removed and log:
+                        log(f'Storage janitor evicted {removed} file(s)')
+                except Exception as e:
+                    if log:
+                        log(f'Storage janitor error: {str(e)}')
+
+        thread = threading.Thread(target=janitor, daemon=True)
+        thread.start()
+        return thread
+
+    def snapshot(self):
+        with self._lock:
+            disk = shutil.disk_usage(self.directory)
+            return {
+                'quota_bytes': self.quota_bytes,
+                'used_bytes': self._usage(),
+                'reserved_bytes': self._reserved(),
+                'files': len(self._files),
+                'disk_free_bytes': disk.free,
+                'evicted_files': self.evicted_files,
+                'evicted_bytes': self.evicted_bytes
+            }
@@ -0,0 +1,81 @@
+import os
+import random
+import cProfile
+import threading
+from contextlib import contextmanager
+
+
+class JobProfiler:
+    """
+    Runs a sampled share of jobs under cProfile and writes each profile to
+    directory as <job_id>-<label>.prof for offline analysis with pstats.
+    """
+
+    def __init__(self, directory, sample_rate=0.0):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self.sample_rate = 0.0
+        self.profiled_jobs = 0
+        self.configure({'sample_rate': sample_rate})
+
+    def configure(self, changes):
+        """Apply a partial configuration update and return the new configuration"""
+        unknown = set(changes) - {'sample_rate'}
+        if unknown:
+            raise ValueError(f'Unknown profiling setting: {sorted(unknown)[0]}')
+        if 'sample_rate' in changes:
+            rate = changes['sample_rate']
+            if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+                raise ValueError('sample_rate must be a number between 0 and 1')
+            with self._lock:
+                self.sample_rate = float(rate)
+        return self.get_config()
+
+    def get_config(self):
+        with self._lock:
+            return {
+                'sample_rate': self.sample_rate,
+                'directory': self.directory,
+                'profiled_jobs': self.profiled_jobs
+            }
+
+    @contextmanager
+    def profile(self, job_id, label):
+        """
+        Profile the calling thread if the job is sampled, yielding the output path or None
+        Only one job is profiled at a time: Python 3.12+ allows a single active profiler
+        per process, so jobs sampled while another is profiled run unprofiled
+        """
+        with self._lock:
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled or not self._active.acquire(blocking=False):
+            yield None
+            return
+
+        profiler = None
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active; never fail the job over it
+            profiler = None
+        if profiler is None:
+            self._active.release()
+            yield None
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{job_id}-{label}.prof')
+        try:
+            yield path
+        finally:
+            profiler.disable()
+            try:
+                profiler.dump_stats(path)
+                with self._lock:
+                    self.profiled_jobs += 1
+            except OSError:
+                pass
+            finally:
+                self._active.release()
@@ -0,0 +1,234 @@
+import time
+import threading
+import traceback
+
+# Lanes
+INTERACTIVE_LANE = 'interactive'
+BULK_LANE = 'bulk'
+
+# Explicit priorities accepted from clients
+PRIORITIES = ('high', 'normal', 'low')
+
+# Jobs estimated below this size go to the interactive lane
+SHORT_JOB_BYTES = 50 * 1024 * 1024  # 50MB
+
+# Fallback bitrates used when formats carry no filesize
+VIDEO_BYTES_PER_SECOND = 250 * 1024  # ~2Mbit/s
+AUDIO_BYTES_PER_SECOND = 24 * 1024   # ~192kbit/s
+
+# Aging: every second a job waits is worth this many bytes of cost
+AGING_BYTES_PER_SECOND = 1024 * 1024  # 1MB/s
+# Bulk jobs waiting this long are served ahead of interactive jobs
+BULK_MAX_WAIT = 120  # 2 minutes
+
+
+def estimate_job_cost(info, format_type):
+    """
+    Estimate the number of bytes a job will transfer from extracted metadata
+    Returns None if the metadata has no usable size or duration
+    """
+    if not info:
+        return None
+
+    audio_only = format_type.lower() == 'mp3'
+    sizes = []
+    for f in info.get('formats') or []:
+        size = f.get('filesize') or f.get('filesize_approx')
+        if not size:
+            continue
+        has_video = f.get('vcodec') not in (None, 'none')
+        has_audio = f.get('acodec') not in (None, 'none')
+        if audio_only:
+            if not has_video:
+                sizes.append((0, size))
+            elif has_audio:
+                # Keep muxed formats as a fallback for audio-only requests
+                sizes.append((1, size))
+        elif has_video and has_audio:
+            # 'best' picks a format with both audio and video
+            sizes.append((0, size))
+        else:
+            # Video-only and audio-only streams are never picked by 'best'
+            sizes.append((1, size))
+
+    if sizes:
+        # yt-dlp picks the best format, which is usually the largest one
+        best_rank = min(rank for rank, _ in sizes)
+        return max(size for rank, size in sizes if rank == best_rank)
+
+    duration = info.get('duration')
+    if duration:
+        rate = AUDIO_BYTES_PER_SECOND if audio_only else VIDEO_BYTES_PER_SECOND
+        return int(duration * rate)
+
+    return None
+
+
+def choose_lane(cost, priority='normal'):
+    """Route a job to a lane based on its explicit priority and estimated cost"""
+    if priority == 'high':
+        return INTERACTIVE_LANE
+    if priority == 'low':
+        return BULK_LANE
+    if cost is not None and cost <= SHORT_JOB_BYTES:
+        return INTERACTIVE_LANE
+    return BULK_LANE
+
+
+class DownloadScheduler:
+    """
+    Shortest-job-first scheduler with an interactive and a bulk lane.
+    A fixed pool of worker threads pulls jobs; bulk jobs never take the slots
+    reserved for interactive work, and waiting jobs age so none starve.
+    client_limit(client_id) may cap how many jobs one client runs at a time.
+    gates maps a platform to an object with available(), on_start() and
+    on_finish(), such as a circuit breaker, that holds that platform's jobs in
+    the queue.
+    """
+
+    def __init__(self, run_job, workers, reserved_interactive=1, client_limit=None, gates=None):
+        self.run_job = run_job
+        self.workers = workers
+        self.reserved_interactive = min(reserved_interactive, workers - 1)
+        self.client_limit = client_limit
+        self.gates = gates or {}
+        self._cond = threading.Condition()
+        self._queue = {}
+        self._running = {}
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'download-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job_id, cost=None, priority='normal', client_id=None, platform=None, delay=0):
+        """Queue a job, optionally not before delay seconds, and return its lane"""
+        lane = choose_lane(cost, priority)
+        now = time.time()
+        with self._cond:
+            self._queue[job_id] = {
+                'job_id': job_id,
+                'client_id': client_id,
+                'platform': platform,
+                'lane': lane,
+                'cost': cost if cost is not None else SHORT_JOB_BYTES * 4,
+                'priority': priority,
+                'queued_at': now,
+                'not_before': now + delay
+            }
+            self._cond.notify()
+        return lane
+
+    def discard(self, job_id):
+        """Remove a job that has not started yet"""
+        with self._cond:
+            return self._queue.pop(job_id, None) is not None
+
+    def reassign(self, job_id, client_id):
+        """Count a queued or running job against another client"""
+        with self._cond:
+            job = self._queue.get(job_id) or self._running.get(job_id)
+            if job is None:
+                return False
+            job['client_id'] = client_id
+            self._cond.notify_all()
+            return True
+
+    def queued_count(self):
+        with self._cond:
+            return len(self._queue)
+
+    def running_count(self):
+        with self._cond:
+            return len(self._running)
+
+    def position(self, job_id):
+        """Get the 1-based position a queued job would be picked in, or None"""
+        with self._cond:
+            if job_id not in self._queue:
+                return None
+            now = time.time()
+            ordered = sorted(self._queue.values(), key=lambda job: self._rank(job, now))
+            return next(i for i, job in enumerate(ordered, 1) if job['job_id'] == job_id)
+
+    def snapshot(self):
+        """Summarize queue and lane state"""
+        with self._cond:
+            lanes = {INTERACTIVE_LANE: {'queued': 0, 'running': 0}, BULK_LANE: {'queued': 0, 'running': 0}}
+            for job in self._queue.values():
+                lanes[job['lane']]['queued'] += 1
+            for job in self._running.values():
+                lanes[job['lane']]['running'] += 1
+            return {'workers': self.workers, 'lanes': lanes}
+
+    def _rank(self, job, now):
+        """Lower ranks are served first"""
+        waited = now - job['queued_at']
+        promoted = job['priority'] == 'high' or job['lane'] == INTERACTIVE_LANE or waited >= BULK_MAX_WAIT
+        return (0 if promoted else 1, job['cost'] - waited * AGING_BYTES_PER_SECOND)
+
+    def _next_job(self):
+        """Pick the next job, leaving reserved slots to interactive work"""
+        now = time.time()
+        bulk_running = sum(1 for job in self._running.values() if job['lane'] == BULK_LANE)
+        bulk_allowed = bulk_running < self.workers - self.reserved_interactive
+
+        client_running = {}
+        for job in self._running.values():
+            client_running[job['client_id']] = client_running.get(job['client_id'], 0) + 1
+
+        def client_allowed(job):
+            if not self.client_limit or job['client_id'] is None:
+                return True
+            limit = self.client_limit(job['client_id'])
+            return not limit or client_running.get(job['client_id'], 0) < limit
+
+        def platform_allowed(job):
+            gate = self.gates.get(job['platform'])
+            return gate is None or gate.available()
+
+        candidates = [
+            job for job in self._queue.values()
+            if job['not_before'] <= now
+            and (job['lane'] == INTERACTIVE_LANE or bulk_allowed or now - job['queued_at'] >= BULK_MAX_WAIT)
+            and client_allowed(job)
+        ]
+        for job in sorted(candidates, key=lambda job: self._rank(job, now)):
+            if platform_allowed(job):
+                return job
+        return None
+
+    def _wait_timeout(self):
+        """Sleep until the next delayed job is due, at most 5 seconds"""
+        now = time.time()
+        delays = [job['not_before'] - now for job in self._queue.values() if job['not_before'] > now]
+        return max(0.05, min(delays + [5]))
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    # Wake up periodically so aged bulk jobs, delayed retries and reconfigured limits apply
+                    self._cond.wait(timeout=self._wait_timeout())
+                    job = self._next_job()
+                del self._queue[job['job_id']]
+                self._running[job['job_id']] = job
+                gate = self.gates.get(job['platform'])
+                trial = gate is not None and gate.on_start()
+
+            try:
+                self.run_job(job['job_id'])
+            except Exception:
+                traceback.print_exc()
+            finally:
+                # A trial that returned early (superseded, cancelled, no disk space)
+                # must not keep the gate closed
+                if trial:
+                    gate.on_finish()
+                with self._cond:
+                    self._running.pop(job['job_id'], None)
+                    self._cond.notify_all()
@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import threading
+
+# boto3 is only needed for the S3 backend
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+MULTIPART_PART_SIZE = 16 * 1024 * 1024  # 16MB, S3 requires at least 5MB per part
+STREAM_CHUNK_SIZE = 1024 * 1024          # 1MB
+
+
+def object_name(key, format_type, filename):
+    """
+    Name an artifact by video and format, so different videos with the same
+    title never overwrite each other
+    """
+    parts = [re.sub(r'[^\w.-]', '_', part) for part in key.split(':', 1)]
+    return '/'.join(parts + [format_type, filename])
+
+
+class LocalStorage:
+    """Finished artifacts kept in a local directory and served by the app itself"""
+
+    name = 'local'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def object_name(self, key, format_type, filename):
+        return object_name(key, format_type, filename)
+
+    def put(self, name, source_path, check=None):
+        """Move a finished file into the store"""
+        path = self.local_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+    def exists(self, name):
+        return os.path.exists(self.local_path(name))
+
+    def delete(self, name):
+        path = self.local_path(name)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    def local_path(self, name):
+        """Get the path of a stored file on this node"""
+        return os.path.join(self.directory, *name.split('/'))
+
+    def presigned_url(self, name, download_name=None):
+        return None
+
+    def snapshot(self):
+        return {'backend': self.name, 'directory': self.directory}
+
+
+class S3Storage:
+    """
+    Finished artifacts kept in an S3-compatible bucket shared by all nodes.
+    Files are uploaded from the job workspace in parts, and can be served by
+    redirecting clients to a presigned URL. endpoint_url points the client at
+    a MinIO or other S3-compatible server. Credentials come from the usual
+    AWS environment variables or config files.
+    """
+
+    name = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 presign_ttl=3600, part_size=MULTIPART_PART_SIZE):
+        if boto3 is None:
+            raise RuntimeError('boto3 is required for the S3 storage backend')
+        if not bucket:
+            raise ValueError('S3 storage needs a bucket')
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.endpoint_url = endpoint_url
+        self.presign_ttl = presign_ttl
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+        # S3-compatible servers usually only support path-style addressing
+        config = Config(signature_version='s3v4',
+                        s3={'addressing_style': 'path' if endpoint_url else 'auto'})
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region, config=config)
+
+    def object_name(self, key, format_type, filename):
+        return object_name(key, format_type, filename)
+
+    def key(self, name):
+        return f'{self.prefix}/{name}' if self.prefix else name
+
+    def put(self, name, source_path, check=None):
+        """
+        Upload a finished file, in parts if it is larger than part_size
+        check is called before each part and may raise to abort the upload
+        """
+        key = self.key(name)
+        size = os.path.getsize(source_path)
+        with open(source_path, 'rb') as f:
+            if size <= self.part_size:
+                if check:
+                    check()
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=f)
+                return
+
+            upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+            try:
+                parts = []
+                part_number = 1
+                while True:
+                    data = f.read(self.part_size)
+                    if not data:
+                        break
+                    if check:
+                        check()
+                    part = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                   PartNumber=part_number, Body=data)
+                    parts.append({'PartNumber': part_number, 'ETag': part['ETag']})
+                    part_number += 1
+                self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                      MultipartUpload={'Parts': parts})
+            except BaseException:
+                # Don't leave stored parts behind
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+                raise
+
+    def exists(self, name):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+
+    def local_path(self, name):
+        return None
+
+    def presigned_url(self, name, download_name=None):
+        """Get a time-limited URL from which clients fetch the file directly"""
+        params = {'Bucket': self.bucket, 'Key': self.key(name)}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.presign_ttl)
+
+    def iter_file(self, name):
+        """Stream a stored file through the app, for clients that can't follow redirects"""
+        body = self.client.get_object(Bucket=self.bucket, Key=self.key(name))['Body']
+        try:
+            for chunk in body.iter_chunks(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    def collect(self, ttl):
+        """Delete objects under the prefix stored more than ttl seconds ago, returning how many"""
+        cutoff = time.time() - ttl
+        expired = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f'{self.prefix}/' if self.prefix else ''):
+            for obj in page.get('Contents', []):
+                if obj['LastModified'].timestamp() < cutoff:
+                    expired.append({'Key': obj['Key']})
+
+        # delete_objects takes at most 1000 keys per call
+        for start in range(0, len(expired), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': expired[start:start + 1000], 'Quiet': True})
+        return len(expired)
+
+    def start_janitor(self, interval, ttl, log=None):
+        """Run collect(ttl) every interval seconds on a daemon thread"""
+        def janitor():
+            while True:
+                time.sleep(interval)
+                try:
+                    removed = self.collect(ttl)
+                    if removed and log:
+                        log(f'Artifact janitor expired {removed} object(s)')
+                except Exception as e:
+                    if log:
+                        log(f'Artifact janitor error: {str(e)}')
+
+        thread = threading.Thread(target=janitor, daemon=True)
+        thread.start()
+        return thread
+
+    def snapshot(self):
+        return {
+            'backend': self.name,
+            'bucket': self.bucket,
+            'prefix': self.prefix,
+            'endpoint_url': self.endpoint_url
+        }
+
+
+def create_storage(backend, directory, **s3_options):
+    """Create the artifact store named by backend ('local' or 's3')"""
+    if backend == 'local':
+        return LocalStorage(directory)
+    if backend == 's3':
+        return S3Storage(**s3_options)
+    raise ValueError(f'Unknown storage backend: {backend}')
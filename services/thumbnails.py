@@ -0,0 +1,231 @@
+import os
+import io
+import hashlib
+import threading
+import urllib.request
+from collections import OrderedDict
+
+# Pillow is only needed to resize; without it the original image is served at every size
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_SIZES = (120, 320, 640)  # widths in pixels
+MAX_SOURCE_BYTES = 5 * 1024 * 1024  # 5MB
+FETCH_TIMEOUT = 10  # seconds
+JPEG_QUALITY = 85
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif')
+]
+
+
+class ThumbnailError(Exception):
+    """Raised when a thumbnail cannot be fetched or decoded"""
+
+
+def sniff_mimetype(data):
+    """Detect the type of an image from its first bytes"""
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mimetype
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def fetch_image(url):
+    """Download an image, refusing anything too large or not an image"""
+    req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    except Exception as e:
+        raise ThumbnailError(f'Could not fetch thumbnail: {str(e)}')
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ThumbnailError('Thumbnail is too large')
+    if not sniff_mimetype(data):
+        raise ThumbnailError('Thumbnail is not a supported image')
+    return data
+
+
+class ThumbnailCache:
+    """
+    Resized thumbnail variants in a directory of at most max_bytes, evicted
+    least recently used first. A source image is fetched once and every size
+    is written from it. Concurrent requests for a thumbnail that is being
+    fetched wait for that fetch instead of starting their own.
+    """
+
+    def __init__(self, directory, max_bytes, sizes=THUMBNAIL_SIZES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sizes = tuple(sizes)
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # name -> {'size', 'etag', 'mimetype'}, least recently used first
+        self._total = 0
+        self._inflight = {}
+        self.fetches = 0
+        self.hits = 0
+        self.evicted_files = 0
+        os.makedirs(directory, exist_ok=True)
+        self.scan()
+
+    def scan(self):
+        """Load the files already in the directory, oldest first"""
+        entries = [entry for entry in os.scandir(self.directory)
+                   if entry.is_file() and not entry.name.startswith('.')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        with self._lock:
+            for entry in entries:
+                size = entry.stat().st_size
+                self._files[entry.name] = {'size': size, 'etag': None, 'mimetype': None}
+                self._total += size
+            self._evict()
+
+    def variant_name(self, key, size):
+        safe_key = key.replace(':', '-')
+        if Image is None:
+            return f'{safe_key}-original'
+        return f'{safe_key}-{size}.jpg'
+
+    def get(self, key, resolve_source, size):
+        """
+        Get (data, etag, mimetype) of a thumbnail variant
+        On a miss, resolve_source(refresh) is called for the upstream image URL.
+        If that URL fails, it is called once more with refresh=True, which
+        should skip any cached URL since signed image URLs expire.
+        Raises ThumbnailError if the image cannot be fetched
+        """
+        if size not in self.sizes:
+            raise ValueError(f'Unsupported thumbnail size: {size}')
+        name = self.variant_name(key, size)
+
+        # A waiting request may have to take over the fetch before the variant exists
+        for attempt in range(3):
+            with self._lock:
+                # Read under the lock, eviction could otherwise delete the file first
+                entry = self._files.get(name)
+                data = self._read(name, entry) if entry else None
+                if data is not None:
+                    self._files.move_to_end(name)
+                    if attempt == 0:
+                        self.hits += 1
+                    return data, entry['etag'], entry['mimetype']
+
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = {'event': threading.Event(), 'error': None}
+                    self._inflight[key] = flight
+
+            if leader:
+                self._fill(key, resolve_source, flight)
+            else:
+                flight['event'].wait(FETCH_TIMEOUT * 2)
+                if flight['error']:
+                    raise ThumbnailError(flight['error'])
+
+        raise ThumbnailError('Thumbnail is not available')
+
+    def _fill(self, key, resolve_source, flight):
+        """Fetch a source image and write all its variants"""
+        try:
+            try:
+                data = fetch_image(resolve_source(False))
+            except ThumbnailError:
+                data = fetch_image(resolve_source(True))
+            variants = self._render(data)
+            with self._lock:
+                self.fetches += 1
+            for size, content in variants.items():
+                self._write(self.variant_name(key, size), content)
+        except Exception as e:
+            flight['error'] = str(e)
+            raise ThumbnailError(str(e))
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight['event'].set()
+
+    def _render(self, data):
+        """Resize an image to each width as JPEG, never scaling it up"""
+        if Image is None:
+            return {self.sizes[0]: data}
+        try:
+            image = Image.open(io.BytesIO(data))
+            image = image.convert('RGB')
+        except Exception as e:
+            raise ThumbnailError(f'Could not decode thumbnail: {str(e)}')
+
+        variants = {}
+        for size in self.sizes:
+            variant = image
+            if image.width > size:
+                height = max(1, round(image.height * size / image.width))
+                variant = image.resize((size, height), Image.LANCZOS)
+            output = io.BytesIO()
+            variant.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            variants[size] = output.getvalue()
+        return variants
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory, name)
+        temp_path = os.path.join(self.directory, f'.{name}.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            previous = self._files.pop(name, None)
+            if previous:
+                self._total -= previous['size']
+            self._files[name] = {
+                'size': len(content),
+                'etag': hashlib.sha1(content).hexdigest()[:20],
+                'mimetype': sniff_mimetype(content)
+            }
+            self._total += len(content)
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used files over the limit; the caller holds the lock"""
+        while self._total > self.max_bytes and len(self._files) > 1:
+            name, entry = self._files.popitem(last=False)
+            self._total -= entry['size']
+            self.evicted_files += 1
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _read(self, name, entry):
+        """Read a cached variant, forgetting it if the file is gone; the caller holds the lock"""
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self._files.pop(name, None)
+            self._total -= entry['size']
+            return None
+        if entry['etag'] is None:
+            # Files found by scan() are hashed on first use
+            entry['etag'] = hashlib.sha1(data).hexdigest()[:20]
+            entry['mimetype'] = sniff_mimetype(data)
+        return data
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'fetches': self.fetches,
+                'evicted_files': self.evicted_files,
+                'resizing': Image is not None
+            }